@@ -0,0 +1,192 @@
+"""
+On-disk cache for the remote stylesheets and fonts the templates pull in.
+
+Every template links Google Fonts and Font Awesome from their CDNs. Instead of
+letting WeasyPrint download them on every render, `url_fetcher` serves them from
+a content-addressed cache: file bodies live under `objects/<sha256>` and each URL
+has a small metadata record under `urls/` pointing at its body.
+
+Run `python asset_cache.py vendor` once (e.g. at build time) to pre-populate the
+cache so rendering works with no network access at all.
+"""
+import os
+import re
+import json
+import hashlib
+import logging
+import argparse
+from urllib.parse import urljoin
+
+import config
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+# Matches <link href="..."> and CSS url(...) / @import "..." references.
+_HTML_URL_RE = re.compile(r'''href\s*=\s*["'](https?://[^"']+)["']''')
+_CSS_URL_RE = re.compile(r'''url\(\s*["']?([^"')]+)["']?\s*\)|@import\s+["']([^"']+)["']''')
+
+
+class AssetNotCached(Exception):
+    """Raised in offline mode when a remote asset has not been vendored."""
+
+
+def _objects_dir() -> str:
+    return os.path.join(config.ASSET_CACHE_DIR, 'objects')
+
+
+def _urls_dir() -> str:
+    return os.path.join(config.ASSET_CACHE_DIR, 'urls')
+
+
+def _url_record_path(url: str) -> str:
+    return os.path.join(_urls_dir(), hashlib.sha256(url.encode('utf-8')).hexdigest() + '.json')
+
+
+def _atomic_write(path: str, data: bytes):
+    """Writes a file via a temporary name so concurrent readers never see partial content."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _load(url: str) -> dict | None:
+    """Returns the cached WeasyPrint fetch result for a URL, or None on a miss."""
+    try:
+        with open(_url_record_path(url)) as f:
+            record = json.load(f)
+        with open(os.path.join(_objects_dir(), record['sha256']), 'rb') as f:
+            body = f.read()
+    except (OSError, ValueError, KeyError):
+        return None
+
+    return {
+        'string': body,
+        'mime_type': record.get('mime_type'),
+        'encoding': record.get('encoding'),
+        'redirected_url': record.get('redirected_url', url),
+    }
+
+
+def _store(url: str, result: dict) -> dict:
+    """Saves a WeasyPrint fetch result in the cache and returns an equivalent result."""
+    body = result.get('string')
+    if body is None:
+        body = result['file_obj'].read()
+    if isinstance(body, str):
+        body = body.encode(result.get('encoding') or 'utf-8')
+
+    sha256 = hashlib.sha256(body).hexdigest()
+    object_path = os.path.join(_objects_dir(), sha256)
+    if not os.path.exists(object_path):
+        _atomic_write(object_path, body)
+
+    record = {
+        'url': url,
+        'sha256': sha256,
+        'mime_type': result.get('mime_type'),
+        'encoding': result.get('encoding'),
+        'redirected_url': result.get('redirected_url') or url,
+    }
+    _atomic_write(_url_record_path(url), json.dumps(record).encode('utf-8'))
+
+    return {
+        'string': body,
+        'mime_type': record['mime_type'],
+        'encoding': record['encoding'],
+        'redirected_url': record['redirected_url'],
+    }
+
+
+def url_fetcher(url: str, timeout: int = 10, ssl_context=None) -> dict:
+    """
+    A WeasyPrint url_fetcher that serves remote assets from the on-disk cache.
+
+    Local URLs (file:, data:) go straight to WeasyPrint's default fetcher. Remote
+    URLs are fetched once and cached; in offline mode a miss raises AssetNotCached,
+    which WeasyPrint logs before rendering with fallback fonts.
+    """
+    from weasyprint import default_url_fetcher
+
+    if not url.startswith(('http://', 'https://')):
+        return default_url_fetcher(url, timeout=timeout, ssl_context=ssl_context)
+
+    cached = _load(url)
+    if cached is not None:
+        return cached
+
+    if config.ASSETS_OFFLINE:
+        raise AssetNotCached(f"Asset '{url}' is not in the cache. Run 'python asset_cache.py vendor'.")
+
+    return _fetch_and_store(url, timeout=timeout, ssl_context=ssl_context)
+
+
+def _fetch_and_store(url: str, timeout: int = 10, ssl_context=None) -> dict:
+    from weasyprint import default_url_fetcher
+
+    logger.info(f"Caching remote asset: {url}")
+    return _store(url, default_url_fetcher(url, timeout=timeout, ssl_context=ssl_context))
+
+
+def _template_urls() -> set[str]:
+    """Collects every remote URL referenced directly by the HTML templates."""
+    urls = set()
+    for filename in os.listdir(TEMPLATES_DIR):
+        if filename.endswith('.html'):
+            with open(os.path.join(TEMPLATES_DIR, filename), encoding='utf-8') as f:
+                html = f.read()
+            urls.update(_HTML_URL_RE.findall(html))
+            urls.update(u for u in _css_urls(html, '') if u.startswith(('http://', 'https://')))
+    return urls
+
+
+def _css_urls(css: str, base_url: str) -> list[str]:
+    """Returns the absolute URLs referenced from a stylesheet."""
+    urls = []
+    for url_ref, import_ref in _CSS_URL_RE.findall(css):
+        ref = (url_ref or import_ref).strip()
+        if ref and not ref.startswith(('data:', '#')):
+            urls.append(urljoin(base_url, ref))
+    return urls
+
+
+def vendor_assets() -> int:
+    """
+    Downloads every remote asset the templates use, following stylesheet references
+    to the font files they load, and stores them in the cache.
+
+    Returns:
+        The number of assets in the cache after vendoring.
+    """
+    pending = list(_template_urls())
+    seen = set()
+    while pending:
+        url = pending.pop()
+        if url in seen:
+            continue
+        seen.add(url)
+
+        try:
+            # Vendoring always goes to the network for misses, even in offline mode.
+            result = _load(url) or _fetch_and_store(url)
+        except Exception as e:
+            logger.error(f"Failed to vendor asset {url}: {e}")
+            continue
+
+        if result.get('mime_type') == 'text/css':
+            css = result['string'].decode(result.get('encoding') or 'utf-8', errors='replace')
+            pending.extend(u for u in _css_urls(css, result['redirected_url']) if u not in seen)
+
+    logger.info(f"Vendored {len(seen)} remote asset(s) into {config.ASSET_CACHE_DIR}.")
+    return len(seen)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Manage the local cache of template fonts and stylesheets.")
+    parser.add_argument("command", choices=["vendor"], help="'vendor' downloads every remote template asset into the cache.")
+    parser.parse_args()
+    vendor_assets()
@@ -0,0 +1,110 @@
+"""
+Shows verification-code lookup cost staying flat as the code pool grows.
+
+Runs firebase_client.verify_and_delete_code against an in-memory fake of the
+Realtime Database reference API, and compares it with the previous approach of
+downloading every code and scanning them. Downloads are simulated with a JSON
+round-trip of the returned data, which is what the SDK pays per response.
+
+Usage: python benchmarks/bench_code_lookup.py
+"""
+import json
+import time
+import uuid
+
+from sample_data import use_repo_modules
+
+use_repo_modules()
+
+import firebase_admin
+import firebase_client
+
+
+class FakeReference:
+    """Just enough of firebase_admin.db.Reference for code verification, with an index on 'key'."""
+
+    def __init__(self, store: dict, index: dict, path: list[str] = None):
+        self._store = store
+        self._index = index
+        self._path = path or []
+        self._equal_to = None
+
+    def _download(self, value):
+        return json.loads(json.dumps(value))
+
+    def get(self):
+        if self._equal_to is not None:
+            push_key = self._index.get(self._equal_to)
+            return self._download({push_key: self._store[push_key]} if push_key else {})
+        if self._path:
+            return self._download(self._store.get(self._path[0]))
+        return self._download(self._store)
+
+    def order_by_child(self, child: str):
+        return self
+
+    def equal_to(self, value):
+        query = FakeReference(self._store, self._index, self._path)
+        query._equal_to = value
+        return query
+
+    def limit_to_first(self, limit: int):
+        return self
+
+    def child(self, push_key: str):
+        return FakeReference(self._store, self._index, [push_key])
+
+    def delete(self):
+        record = self._store.pop(self._path[0], None)
+        if record:
+            self._index.pop(record['key'], None)
+
+    def transaction(self, update):
+        current = self._download(self._store.get(self._path[0]))
+        new_value = update(current)
+        if new_value is None:
+            self.delete()
+        return new_value
+
+
+def _linear_scan(ref, code: str) -> bool:
+    """The previous implementation: download every code and scan them."""
+    for push_key, data in (ref.get() or {}).items():
+        if isinstance(data, dict) and data.get('key') == code:
+            ref.child(push_key).delete()
+            return True
+    return False
+
+
+def _build(size: int) -> tuple[FakeReference, list[str]]:
+    store, index, codes = {}, {}, []
+    for _ in range(size):
+        push_key, code = uuid.uuid4().hex, uuid.uuid4().hex[:8]
+        store[push_key] = {'key': code}
+        index[code] = push_key
+        codes.append(code)
+    return FakeReference(store, index), codes
+
+
+def _time_per_lookup(verify, ref, codes: list[str], lookups: int = 20) -> float:
+    start = time.perf_counter()
+    for code in codes[:lookups]:
+        assert verify(ref, code)
+    return (time.perf_counter() - start) / lookups * 1000
+
+
+def main():
+    firebase_admin._apps['[DEFAULT]'] = object()  # Pretend the SDK is initialized.
+    print(f"{'codes':>8} {'full scan':>12} {'indexed':>12}")
+    for size in (1_000, 10_000, 100_000):
+        ref, codes = _build(size)
+        scan_ms = _time_per_lookup(_linear_scan, ref, codes)
+
+        ref, codes = _build(size)
+        firebase_client.db.reference = lambda path: ref
+        indexed_ms = _time_per_lookup(lambda _, code: firebase_client.verify_and_delete_code(code), ref, codes)
+        print(f"{size:>8} {scan_ms:>10.2f}ms {indexed_ms:>10.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Compares Gemini round-trips per resume with and without combined extraction.
+
+The model is replaced by a stub that sleeps for a fixed latency and returns canned
+answers, so the benchmark measures the request pattern, not the network. Each run
+parses a free-form resume (which the local template parser cannot handle, so it
+reaches the model) and then asks for its 'About Me' text, as a session does.
+
+Usage: python benchmarks/bench_combined_extraction.py [resumes] [latency seconds]
+"""
+import sys
+import json
+import time
+import asyncio
+
+from sample_data import SAMPLE_RESUME, SAMPLE_RESUME_TEXT
+
+import config
+import gemini_client
+
+
+class _Response:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class StubModel:
+    """Answers parse prompts with JSON (plus about_me when asked) and anything else with prose."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    async def generate_content_async(self, prompt: str, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if "Text to parse" in prompt:
+            data = {k: v for k, v in SAMPLE_RESUME.items() if k not in ('about_me', 'photo_path')}
+            data['name'] = prompt.split("My name is ", 1)[1].split(".", 1)[0]
+            if "'about_me'" in prompt:
+                data['about_me'] = SAMPLE_RESUME['about_me']
+            return _Response(json.dumps(data))
+        return _Response(SAMPLE_RESUME['about_me'])
+
+
+async def _session(index: int):
+    parsed = await gemini_client.parse_resume_from_template(SAMPLE_RESUME_TEXT.format(name=f"Benchmark User {index}"))
+    await gemini_client.generate_about_me(parsed)
+
+
+async def _run(resumes: int, latency: float, combined: bool) -> tuple[int, float]:
+    config.GEMINI_COMBINED_EXTRACTION = combined
+    stub = StubModel(latency)
+    gemini_client.model = stub
+    start = time.perf_counter()
+    for index in range(resumes):
+        # Distinct names per mode so the 'About Me' cache never carries over between runs.
+        await _session(index + (0 if combined else resumes))
+    return stub.calls, time.perf_counter() - start
+
+
+def main(resumes: int, latency: float):
+    # Isolate the request pattern from quota pacing.
+    gemini_client.scheduler = gemini_client.GeminiScheduler(1, 10**6, 10**9)
+    for combined in (False, True):
+        calls, elapsed = asyncio.run(_run(resumes, latency, combined))
+        mode = "combined" if combined else "separate"
+        print(f"{mode:<9} {calls / resumes:.2f} requests/resume  {elapsed / resumes * 1000:.0f}ms/resume")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20, float(sys.argv[2]) if len(sys.argv) > 2 else 0.5)
@@ -0,0 +1,79 @@
+"""
+Times session expiry bookkeeping at 100k concurrent sessions.
+
+Runs session_expiry.SessionExpiry through a day of traffic (start every session,
+touch each one a few times, cancel a tenth, sweep through expiry) and compares
+cancelling with the previous approach of one named JobQueue job per session,
+which found a session's job with a linear scan of the job list
+(JobQueue.get_jobs_by_name). The linear scan is timed on a sample and scaled up.
+
+Usage: python benchmarks/bench_session_expiry.py [sessions]
+"""
+import sys
+import time
+import random
+
+from sample_data import use_repo_modules
+
+use_repo_modules()
+
+from session_expiry import SessionExpiry
+
+TIMEOUT = 6 * 3600
+RESOLUTION = 60
+TOUCHES_PER_SESSION = 5
+SCAN_SAMPLE = 200
+
+
+def timed(label: str, operations: int, fn):
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {elapsed * 1000:9.1f} ms  ({elapsed / operations * 1e6:6.2f} us/op)")
+    return result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    user_ids = random.sample(range(10 ** 9), count)
+    now = time.time()
+    wheel = SessionExpiry(TIMEOUT, RESOLUTION)
+
+    print(f"{count} sessions, {TIMEOUT // 3600}h sliding timeout, {RESOLUTION}s slots\n")
+    timed("start", count, lambda: [wheel.start(user_id, user_id, now=now) for user_id in user_ids])
+
+    def touch_all():
+        for step in range(1, TOUCHES_PER_SESSION + 1):
+            touched_at = now + step * 600
+            for user_id in user_ids:
+                wheel.touch(user_id, now=touched_at)
+    timed("touch", count * TOUCHES_PER_SESSION, touch_all)
+
+    cancelled = user_ids[::10]
+    timed("cancel", len(cancelled), lambda: [wheel.cancel(user_id) for user_id in cancelled])
+
+    last_touch = now + TOUCHES_PER_SESSION * 600
+    sweeps = int((TIMEOUT + 1200) // RESOLUTION)
+
+    def sweep_all():
+        expired = 0
+        for step in range(sweeps):
+            expired += len(wheel.sweep(now=last_touch + step * RESOLUTION))
+        return expired
+    expired = timed(f"sweep ({sweeps} ticks)", sweeps, sweep_all)
+    print(f"\nexpired {expired} of {count - len(cancelled)} remaining sessions, {wheel.stats()}")
+
+    # Previous approach: one job per session, found by name with a scan of every job.
+    jobs = [str(user_id) for user_id in user_ids]
+    sample = random.sample(cancelled, min(SCAN_SAMPLE, len(cancelled)))
+    started = time.perf_counter()
+    for user_id in sample:
+        name = str(user_id)
+        [job for job in jobs if job == name]
+    per_lookup = (time.perf_counter() - started) / len(sample)
+    print(f"\njob-per-session cancel       {per_lookup * len(cancelled) * 1000:9.1f} ms  "
+          f"({per_lookup * 1e6:6.2f} us/op, scan of {count} jobs, scaled from {len(sample)} lookups)")
+
+
+if __name__ == "__main__":
+    main()
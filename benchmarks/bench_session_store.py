@@ -0,0 +1,105 @@
+"""
+Measures session memory and write cost under a synthetic 50k-session load.
+
+Compares keeping every session's user_data dict in process memory (what the bot
+did without persistence) with session_store.SqlitePersistence after a restart,
+where only the sessions that send an update are loaded. Also times writing the
+sessions one commit per update against the batched persistence cycle.
+
+Usage: python benchmarks/bench_session_store.py [sessions] [active percent]
+"""
+import os
+import sys
+import time
+import sqlite3
+import asyncio
+import tempfile
+import tracemalloc
+from enum import Enum
+
+from sample_data import SAMPLE_RESUME
+
+import session_store
+
+
+class States(Enum):
+    AWAITING_REGENERATION = 3
+
+
+def make_session(user_id: int) -> dict:
+    user_data = dict(SAMPLE_RESUME, name=f"User {user_id}")
+    user_data.update(user_id=user_id, verified=True, generation_attempts=4,
+                     selected_template='modern', last_template='modern')
+    return user_data
+
+
+def traced(fn):
+    """Runs fn and returns its result and the memory it left allocated, in MB."""
+    tracemalloc.start()
+    result = fn()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current / 1024 / 1024
+
+
+async def main(count: int, active_percent: float):
+    db_path = os.path.join(tempfile.mkdtemp(), 'sessions.sqlite3')
+    print(f"{count} sessions, {active_percent:g}% active after restart\n")
+
+    _, in_memory_mb = traced(lambda: {user_id: make_session(user_id) for user_id in range(count)})
+    print(f"{'all sessions in memory':<34} {in_memory_mb:8.1f} MB")
+
+    # Batched writes: one persistence cycle per 1000 changed sessions.
+    persistence = session_store.SqlitePersistence(db_path, States)
+    started = time.perf_counter()
+    for batch_start in range(0, count, 1000):
+        for user_id in range(batch_start, min(batch_start + 1000, count)):
+            await persistence.update_user_data(user_id, make_session(user_id))
+            await persistence.update_conversation('resume_conversation', (user_id, user_id), States.AWAITING_REGENERATION)
+        await asyncio.sleep(0)  # Lets the scheduled commit run, as it does after each cycle.
+    batched = time.perf_counter() - started
+    await persistence.flush()
+    print(f"{'batched writes':<34} {batched * 1000:8.1f} ms  ({persistence.commits} commits)")
+    print(f"{'database size':<34} {os.path.getsize(db_path) / 1024 / 1024:8.1f} MB")
+
+    # Restart: conversations are loaded up front, user_data only for users who return.
+    async def restart():
+        restored = session_store.SqlitePersistence(db_path, States)
+        conversations = await restored.get_conversations('resume_conversation')
+        user_data = await restored.get_user_data()
+        for user_id in range(0, count, max(1, int(100 / active_percent))):
+            user_data[user_id] = {}
+            await restored.refresh_user_data(user_id, user_data[user_id])
+        return restored, conversations, user_data
+
+    tracemalloc.start()
+    restored, conversations, user_data = await restart()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{'after restart (lazy load)':<34} {current / 1024 / 1024:8.1f} MB  "
+          f"({len(conversations)} conversation states, {len(user_data)} sessions loaded)")
+    await restored.flush()
+
+    # One commit per update, as a persistence writing straight through would do.
+    sample = min(count, 2000)
+    conn = sqlite3.connect(os.path.join(tempfile.mkdtemp(), 'sessions.sqlite3'))
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(session_store._SCHEMA)
+    placeholders = ', '.join('?' * (len(session_store.COLUMNS) + 1))
+    started = time.perf_counter()
+    for user_id in range(sample):
+        with conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO sessions ({', '.join(session_store.COLUMNS)}, updated_at) VALUES ({placeholders})",
+                (user_id, *session_store.encode(make_session(user_id)), time.time()),
+            )
+    per_update = (time.perf_counter() - started) / sample
+    conn.close()
+    print(f"{'commit per update':<34} {per_update * count * 1000:8.1f} ms  (scaled from {sample} commits)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 50_000,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 2,
+    ))
@@ -0,0 +1,63 @@
+"""
+Measures the per-render time saved by the pre-parsed stylesheet cache.
+
+For every template in config.TEMPLATES, renders the sample resume with WeasyPrint
+parsing the full document (the old path) and with the CSS served from the
+stylesheets cache, and prints the mean time of each.
+
+Usage: python benchmarks/bench_stylesheets.py [iterations]
+"""
+import os
+import sys
+import time
+import statistics
+
+from sample_data import SAMPLE_RESUME
+
+from weasyprint import HTML
+
+import asset_cache
+import config
+import stylesheets
+import templating
+
+
+def _time(fn, iterations: int) -> float:
+    fn()  # Warm-up: fills the asset cache and the stylesheet cache.
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.mean(samples) * 1000
+
+
+def main(iterations: int):
+    env = templating.get_environment()
+    print(f"{'template':<12} {'full parse':>12} {'cached css':>12} {'saved':>10}")
+    total_saved = 0.0
+    for template_path in config.TEMPLATES.values():
+        template_filename = os.path.basename(template_path)
+        html_out = env.get_template(template_filename).render(SAMPLE_RESUME)
+
+        def full_parse():
+            HTML(string=html_out, base_url=templating.TEMPLATES_DIR,
+                 url_fetcher=asset_cache.url_fetcher).write_pdf()
+
+        def cached_css():
+            HTML(string=stylesheets.strip_stylesheets(html_out), base_url=templating.TEMPLATES_DIR,
+                 url_fetcher=asset_cache.url_fetcher).write_pdf(
+                stylesheets=stylesheets.get_stylesheets(template_filename, SAMPLE_RESUME),
+                font_config=stylesheets.get_font_config(),
+            )
+
+        before = _time(full_parse, iterations)
+        after = _time(cached_css, iterations)
+        total_saved += before - after
+        print(f"{template_filename:<12} {before:>10.1f}ms {after:>10.1f}ms {before - after:>8.1f}ms")
+
+    print(f"Mean saving per render: {total_saved / len(config.TEMPLATES):.1f}ms")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,54 @@
+"""Shared fixtures for the benchmark scripts."""
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def use_repo_modules():
+    """Makes the bot's modules importable from a benchmark script. Safe to call more than once."""
+    # Benchmarks run from a checkout without a real .env; config only needs the keys to exist.
+    os.environ.setdefault("TELEGRAM_BOT_TOKEN", "benchmark")
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    os.environ.setdefault("SECRET_TOKEN", "benchmark")
+    if REPO_ROOT not in sys.path:
+        sys.path.insert(0, REPO_ROOT)
+
+
+use_repo_modules()
+
+SAMPLE_RESUME = {
+    'name': 'Jane Perera',
+    'birthday': '1994-03-12',
+    'email': 'jane.perera@example.com',
+    'phone': '+94 77 123 4567',
+    'website': 'https://janeperera.dev',
+    'address': '12 Lake Road, Colombo',
+    'language': 'English, Sinhala',
+    'nic_number': '941234567V',
+    'skills': [
+        {'name': 'Python', 'rating': 5},
+        {'name': 'SQL', 'rating': 4},
+        {'name': 'Project Management', 'rating': 3},
+    ],
+    'experience': [
+        'Senior Developer, Acme Corp, 2020 - Present, Led the payments platform team',
+        'Developer, Globex, 2016 - 2020, Built internal reporting tools',
+    ],
+    'education': [
+        'BSc Computer Science, University of Colombo, 2016',
+    ],
+    'about_me': 'Backend engineer with eight years of experience building reliable payment systems.',
+    'photo_path': None,
+}
+
+# The same resume written as free-form prose rather than in RESUME_TEMPLATE's format,
+# so template_parser rejects it and parsing goes to the model. Format with name=...
+SAMPLE_RESUME_TEXT = """My name is {name}. I was born on 12 March 1994 and live at 12 Lake Road, Colombo.
+You can reach me at jane.perera@example.com or +94 77 123 4567, and my site is janeperera.dev.
+I speak English and Sinhala, and my NIC number is 941234567V.
+Since 2020 I have been a Senior Developer at Acme Corp, leading the payments platform team;
+before that I built internal reporting tools as a Developer at Globex from 2016 to 2020.
+I hold a BSc in Computer Science from the University of Colombo (2016).
+I'm strongest in Python, good with SQL, and comfortable with project management.
+"""
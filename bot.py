@@ -8,7 +8,9 @@ from telegram.ext import (
     ContextTypes,
     ConversationHandler,
     CallbackQueryHandler,
+    CallbackContext,
     MessageHandler,
+    TypeHandler,
     filters,
 )
 
@@ -51,10 +53,27 @@ Skills:
 """
 
 import os
+import sys
+import io
+import csv
 import asyncio
 import tempfile
+from datetime import datetime, timezone
 import firebase_client
 import user_data_store
+import render_pool
+import templating
+import pdf_cache
+import speculative
+import prefetch
+import template_parser
+import update_queue
+import dedupe
+import template_gallery
+import temp_reaper
+import session_expiry
+import session_store
+import workers
 
 # Define conversation states using an Enum for clarity
 class States(Enum):
@@ -70,6 +89,12 @@ class States(Enum):
     EDITING_SKILLS = 8
 
 
+# Redelivered webhook updates are dropped; without the ordered dispatcher, concurrent
+# PDF generations per user are merged.
+_recent_updates = dedupe.RecentUpdateIds(config.UPDATE_DEDUPE_WINDOW)
+_generations = dedupe.SingleFlight()
+
+
 # --- START HANDLER ---
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Prompts the user to enter their verification code."""
@@ -84,16 +109,17 @@ async def handle_verification_code(update: Update, context: ContextTypes.DEFAULT
     """Verifies the user's code and starts the resume building process."""
     code = update.message.text.strip()
     
-    if firebase_client.verify_and_delete_code(code):
+    if await firebase_client.verify_code(code):
         user_id = update.message.from_user.id
         chat_id = update.message.chat_id
 
         context.user_data['verified'] = True
         context.user_data['generation_attempts'] = 5
         context.user_data['user_id'] = user_id
+        context.user_data['chat_id'] = chat_id
 
-        # Schedule a cleanup job for 6 hours later
-        context.job_queue.run_once(timeout_cleanup, 6 * 3600, chat_id=chat_id, name=str(user_id))
+        # Expire the session after SESSION_TIMEOUT (of inactivity, if sliding)
+        session_expiry.sessions.start(user_id, chat_id)
 
         await update.message.reply_text(
             "Verification successful! Your session has started.\n\n"
@@ -141,6 +167,9 @@ async def handle_template_input(update: Update, context: ContextTypes.DEFAULT_TY
     # The user might not have a photo, so we need to handle that.
     context.user_data.setdefault('photo_path', None)
 
+    # Write the 'About Me' text in the background while the user picks a template
+    prefetch.start_about_me(context.user_data.get('user_id'), context.user_data)
+
     # Now, start the template selection process
     await update.message.reply_text("Great! Now, let's select a template for your resume.")
     return await send_template_previews(update, context)
@@ -148,29 +177,7 @@ async def handle_template_input(update: Update, context: ContextTypes.DEFAULT_TY
 async def send_template_previews(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Sends the template previews to the user."""
     await update.message.reply_text("Please choose a template from the following options:")
-
-    for template_name in config.TEMPLATES.keys():
-        image_path_jpg = f"image/{template_name}.jpg"
-        image_path_png = f"image/{template_name}.png"
-        
-        image_path = None
-        if os.path.exists(image_path_jpg):
-            image_path = image_path_jpg
-        elif os.path.exists(image_path_png):
-            image_path = image_path_png
-
-        if image_path:
-            keyboard = [[InlineKeyboardButton("Select this template", callback_data=f"template_{template_name}")]]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-
-            await update.message.reply_photo(
-                photo=open(image_path, 'rb'),
-                caption=template_name.capitalize(),
-                reply_markup=reply_markup
-            )
-        else:
-            logger.warning(f"Image for template '{template_name}' not found.")
-
+    await template_gallery.send_gallery(context.bot, update.effective_chat.id)
     return States.AWAITING_TEMPLATE_SELECTION
 
 async def handle_template_selection(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -251,44 +258,79 @@ async def edit_skills(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
     await update.callback_query.message.reply_text("Please send your updated skills in the same format as the template.")
     return States.EDITING_SKILLS
 
+def _merge_section_edit(context: ContextTypes.DEFAULT_TYPE, updates: dict) -> list[str]:
+    """
+    Merges a re-parsed section into user_data and drops what it made stale.
+
+    Returns:
+        The derived artifacts that no longer match the data: 'about_me' when a field
+        the 'About Me' text is written from changed, and 'rendered_pdfs' when any field changed.
+    """
+    user_id = context.user_data.get('user_id')
+    previous_about_me_key = gemini_client.about_me_cache_key(context.user_data)
+    changed = any(context.user_data.get(field) != value for field, value in updates.items())
+    context.user_data.update(updates)
+
+    stale = []
+    if gemini_client.about_me_cache_key(context.user_data) != previous_about_me_key:
+        gemini_client.invalidate_about_me(previous_about_me_key)
+        prefetch.start_about_me(user_id, context.user_data)
+        stale.append('about_me')
+    if changed:
+        # Cached PDFs are keyed by content, so only the speculative one needs dropping.
+        speculative.cancel(user_id)
+        stale.append('rendered_pdfs')
+    if stale:
+        logger.info(f"Edit made stale for user {user_id}: {', '.join(stale)}")
+    return stale
+
+async def _handle_section_edit(update: Update, context: ContextTypes.DEFAULT_TYPE, section: str, label: str, retry_state: States) -> int:
+    """Re-parses only the edited section and returns to the review menu."""
+    updates = await gemini_client.parse_resume_section(section, update.message.text)
+    if updates is None:
+        await update.message.reply_text(
+            f"Sorry, I couldn't understand your updated {label}. Please try again in the same format as the template."
+        )
+        return retry_state
+
+    _merge_section_edit(context, updates)
+    await update.message.reply_text(f"{label.capitalize()} updated.")
+    return await show_review_menu(update, context)
+
 async def handle_edited_personal_details(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handles the user's edited personal details."""
-    # This is a simplified parser. A more robust solution would be to use the AI again.
-    # For now, we'll just assume the user provides the data in a key: value format.
-    for line in update.message.text.split('\n'):
-        if ':' in line:
-            key, value = line.split(':', 1)
-            key = key.strip().lower().replace(' ', '_')
-            context.user_data[key] = value.strip()
-
-    await update.message.reply_text("Personal details updated.")
-    return await show_review_menu(update, context)
+    return await _handle_section_edit(update, context, 'personal', 'personal details', States.EDITING_PERSONAL_DETAILS)
 
 async def handle_edited_experience(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handles the user's edited experience."""
-    context.user_data['experience'] = [exp.strip() for exp in update.message.text.split('\n')]
-    await update.message.reply_text("Experience updated.")
-    return await show_review_menu(update, context)
+    return await _handle_section_edit(update, context, 'experience', 'experience', States.EDITING_EXPERIENCE)
 
 async def handle_edited_education(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handles the user's edited education."""
-    context.user_data['education'] = [edu.strip() for edu in update.message.text.split('\n')]
-    await update.message.reply_text("Education updated.")
-    return await show_review_menu(update, context)
+    return await _handle_section_edit(update, context, 'education', 'education', States.EDITING_EDUCATION)
 
 async def handle_edited_skills(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Handles the user's edited skills."""
-    skills = []
-    for line in update.message.text.split('\n'):
-        if ',' in line:
-            name, rating = line.split(',', 1)
-            skills.append({'name': name.strip(), 'rating': int(rating.strip())})
-    context.user_data['skills'] = skills
-    await update.message.reply_text("Skills updated.")
-    return await show_review_menu(update, context)
+    return await _handle_section_edit(update, context, 'skills', 'skills', States.EDITING_SKILLS)
 
 
 async def generate_and_send_pdf(update: Update, context: ContextTypes.DEFAULT_TYPE, exclude_template: str = None) -> int:
+    """
+    Generates and sends the PDF, at most once at a time per user: a duplicate request
+    (e.g. a double-tapped button) waits for the generation in flight instead of starting another.
+
+    With WEBHOOK_ASYNC_INGESTION the dispatcher already processes a chat's updates one
+    at a time, so generations of one user cannot overlap and no coalescing is needed.
+    """
+    if config.WEBHOOK_ASYNC_INGESTION:
+        return await _generate_and_send_pdf(update, context, exclude_template)
+    return await _generations.run(
+        update.effective_user.id,
+        lambda: _generate_and_send_pdf(update, context, exclude_template),
+    )
+
+
+async def _generate_and_send_pdf(update: Update, context: ContextTypes.DEFAULT_TYPE, exclude_template: str = None) -> int:
     """Helper function to generate, send, and clean up the PDF."""
     message_sender = update.callback_query.message if update.callback_query else update.message
 
@@ -304,30 +346,56 @@ async def generate_and_send_pdf(update: Update, context: ContextTypes.DEFAULT_TY
 
     logger.info(f"Final user data: {context.user_data}")
     
-    # The generator now returns a tuple: (path, template_name)
+    # The generator returns a tuple: (PDF file object, template_name)
     selected_template = context.user_data.get('selected_template')
-    pdf_generation_result = generator.generate_pdf(context.user_data, selected_template=selected_template, exclude_template=exclude_template)
+    pdf_generation_result = None
+    if exclude_template:
+        # A regeneration may already have been rendered in the background
+        pdf_generation_result = await speculative.take(context.user_data.get('user_id'))
+    if not pdf_generation_result:
+        about_me = await prefetch.get_about_me(context.user_data.get('user_id'), context.user_data)
+        try:
+            pdf_generation_result = await generator.generate_pdf(context.user_data, selected_template=selected_template, exclude_template=exclude_template, about_me=about_me, stream=True)
+        except (render_pool.RenderQueueFull, render_pool.RenderTimeout) as e:
+            # The session is kept: the user can retry from where they were.
+            logger.warning(f"Render rejected for user {context.user_data.get('user_id')}: {e}")
+            if exclude_template:
+                await message_sender.reply_text(
+                    "The resume renderer is busy right now. Please try again in a minute.",
+                    reply_markup=ReplyKeyboardMarkup(
+                        [["🎨 Regenerate with New Design", "✅ Finish"]], one_time_keyboard=True, resize_keyboard=True
+                    ),
+                )
+                return States.AWAITING_REGENERATION
+            await message_sender.reply_text(
+                "The resume renderer is busy right now. Please try again in a minute.",
+                reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("Generate PDF", callback_data='review_no')]]),
+            )
+            return States.AWAITING_REVIEW_CHOICE
 
     if pdf_generation_result:
-        pdf_path, template_name = pdf_generation_result
+        pdf_stream, template_name = pdf_generation_result
         context.user_data['last_template'] = template_name # Save the used template
         
         # Decrement generation attempts
         context.user_data['generation_attempts'] -= 1
         attempts_left = context.user_data['generation_attempts']
         
-        await message_sender.reply_document(
-            document=open(pdf_path, 'rb'),
-            filename=f"{context.user_data.get('name', 'resume')}.pdf",
-            caption=f"Here is your generated resume! You have {attempts_left} attempts remaining."
-        )
-        os.remove(pdf_path)
+        with pdf_stream:
+            await message_sender.reply_document(
+                document=pdf_stream,
+                filename=f"{context.user_data.get('name', 'resume')}.pdf",
+                caption=f"Here is your generated resume! You have {attempts_left} attempts remaining."
+            )
 
         # Log the user who generated the PDF
-        user_data_store.add_user(context.user_data.get('name'))
+        user_data_store.add_user(context.user_data.get('name'), template_name)
 
         # Only offer regeneration if the user has attempts left
         if attempts_left > 0:
+            if config.SPECULATIVE_RENDER:
+                if not speculative.start(context.user_data.get('user_id'), context.user_data, exclude_template=template_name):
+                    logger.warning(f"No regeneration was pre-rendered after template '{template_name}'.")
             reply_keyboard = [["🎨 Regenerate with New Design", "✅ Finish"]]
         else:
             reply_keyboard = [["✅ Finish"]]
@@ -364,51 +432,68 @@ async def handle_regeneration_choice(update: Update, context: ContextTypes.DEFAU
         return await finish_conversation(update, context)
 
 
-def _remove_job_if_exists(name: str, context: ContextTypes.DEFAULT_TYPE) -> bool:
-    """Remove job with given name. Returns whether job was removed."""
-    current_jobs = context.job_queue.get_jobs_by_name(name)
-    if not current_jobs:
-        return False
-    for job in current_jobs:
-        job.schedule_removal()
-    return True
-
-async def _cleanup_session(context: ContextTypes.DEFAULT_TYPE):
-    """Cleans up all user data and removes any scheduled jobs."""
+async def _cleanup_session(context: ContextTypes.DEFAULT_TYPE, user_id: int):
+    """Cleans up all user data and ends the session's expiry and background tasks."""
     if 'user_id' in context.user_data:
-        _remove_job_if_exists(str(context.user_data['user_id']), context)
+        session_expiry.sessions.cancel(context.user_data['user_id'])
+        speculative.cancel(context.user_data['user_id'])
+        prefetch.cancel(context.user_data['user_id'])
 
     if context.user_data.get('photo_path'):
         local_photo_path = context.user_data['photo_path'].replace('file://', '')
         if os.path.exists(local_photo_path):
             try:
                 os.remove(local_photo_path)
+                temp_reaper.unregister(local_photo_path)
                 logger.info(f"Cleaned up photo: {local_photo_path}")
             except OSError as e:
                 logger.error(f"Error cleaning up photo {local_photo_path}: {e}")
 
     context.user_data.clear()
-
-async def timeout_cleanup(context: ContextTypes.DEFAULT_TYPE):
-    """Sends a timeout message and cleans up the session."""
-    await context.bot.send_message(
-        chat_id=context.job.chat_id,
-        text="Your session has timed out due to 6 hours of inactivity. Please /start again."
-    )
-    await _cleanup_session(context)
+    # Forget the user entirely (including the persisted row), not just their data.
+    context.application.drop_user_data(user_id)
+
+async def touch_session(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Slides the session deadline of a user on every update they send."""
+    if update.effective_user:
+        session_expiry.sessions.touch(update.effective_user.id)
+
+def _format_duration(seconds: int) -> str:
+    """Formats a duration for users, e.g. '6 hours', '1 hour 30 minutes' or '45 seconds'."""
+    hours, remainder = divmod(int(seconds), 3600)
+    minutes, seconds = divmod(remainder, 60)
+    parts = [f"{value} {unit}{'s' if value != 1 else ''}"
+             for value, unit in ((hours, 'hour'), (minutes, 'minute'), (seconds, 'second')) if value]
+    return ' '.join(parts) or '0 seconds'
+
+async def expire_sessions(context: ContextTypes.DEFAULT_TYPE):
+    """Sends a timeout message to, and cleans up, every session that expired since the last sweep."""
+    duration = _format_duration(config.SESSION_TIMEOUT)
+    for user_id, chat_id in session_expiry.sessions.sweep():
+        user_context = CallbackContext(context.application, chat_id=chat_id, user_id=user_id)
+        # Sessions restored after a restart are only loaded once used; load this one to clean it up.
+        await user_context.refresh_data()
+        try:
+            await context.bot.send_message(
+                chat_id=chat_id,
+                text=f"Your session has timed out due to {duration} of inactivity. Please /start again."
+            )
+        except Exception as e:
+            logger.error(f"Error sending timeout message to user {user_id}: {e}")
+        await _cleanup_session(user_context, user_id)
 
 
 async def finish_conversation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Clears user data and ends the conversation."""
     await update.message.reply_text("Great! Feel free to start over any time with /start.", reply_markup=ReplyKeyboardRemove())
-    await _cleanup_session(context)
+    await _cleanup_session(context, update.effective_user.id)
     return ConversationHandler.END
 
 
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Cancels and ends the conversation."""
     await update.message.reply_text("Operation cancelled.", reply_markup=ReplyKeyboardRemove())
-    await _cleanup_session(context)
+    await _cleanup_session(context, update.effective_user.id)
     return ConversationHandler.END
 
 
@@ -432,62 +517,107 @@ async def fallback_callback_handler(update: Update, context: ContextTypes.DEFAUL
     return ConversationHandler.END
 
 
-import time
+async def flush_user_data(context: ContextTypes.DEFAULT_TYPE):
+    """Writes buffered PDF generation records to the data store."""
+    user_data_store.flush()
 
-async def cleanup_old_files(context: ContextTypes.DEFAULT_TYPE):
-    """
-    Cleans up old temporary files (photos and PDFs) that are older than 6 hours.
-    """
-    now = time.time()
-    six_hours_ago = now - (6 * 3600)
-
-    # Cleanup PDFs
-    pdf_dir = "/tmp/resume_bot/pdfs"
-    if os.path.exists(pdf_dir):
-        for filename in os.listdir(pdf_dir):
-            filepath = os.path.join(pdf_dir, filename)
-            if os.path.isfile(filepath):
-                file_mod_time = os.path.getmtime(filepath)
-                if file_mod_time < six_hours_ago:
-                    os.remove(filepath)
-                    logger.info(f"Cleaned up old PDF: {filepath}")
-
-    # Cleanup photos
-    photo_base_dir = os.path.join(tempfile.gettempdir(), "resume_bot")
-    if os.path.exists(photo_base_dir):
-        for user_dir in os.listdir(photo_base_dir):
-            user_dir_path = os.path.join(photo_base_dir, user_dir)
-            if os.path.isdir(user_dir_path):
-                for filename in os.listdir(user_dir_path):
-                    filepath = os.path.join(user_dir_path, filename)
-                    if os.path.isfile(filepath):
-                        file_mod_time = os.path.getmtime(filepath)
-                        if file_mod_time < six_hours_ago:
-                            os.remove(filepath)
-                            logger.info(f"Cleaned up old photo: {filepath}")
+
+def _data_summary_text() -> str:
+    """Formats the aggregate generation counters for the /data command."""
+    stats = user_data_store.get_stats()
+    if not stats['users']:
+        return "No users have generated a PDF yet."
+
+    lines = [f"Users: {stats['users']}", f"PDFs generated: {stats['pdfs']}", "", "PDFs per day:"]
+    lines += [f"  {day}: {count}" for day, count in stats['per_day']]
+    lines += ["", "PDFs per template:"]
+    lines += [f"  {template}: {count}" for template, count in stats['per_template']]
+    return "\n".join(lines)
+
+
+def _data_menu_markup() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("Browse users", callback_data='data_page_0')],
+        [InlineKeyboardButton("Export CSV", callback_data='data_export_csv'),
+         InlineKeyboardButton("Export JSONL", callback_data='data_export_jsonl')],
+    ])
 
 
 async def get_data(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Sends the list of users who have generated a PDF to the admin."""
+    """Sends PDF generation statistics to the admin, with options to browse or export the users."""
     user_id = update.message.from_user.id
     if str(user_id) == config.ADMIN_CHAT_ID:
-        users = user_data_store.get_all_users()
-        if users:
-            message = "Users who have generated a PDF:\n\n" + "\n".join(users)
-        else:
-            message = "No users have generated a PDF yet."
-        await update.message.reply_text(message)
+        await update.message.reply_text(_data_summary_text(), reply_markup=_data_menu_markup())
     else:
         await update.message.reply_text("You are not authorized to use this command.")
 
 
+def _export_generations(fmt: str):
+    """Streams every generation record into a temporary file and returns it, rewound."""
+    export_file = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    text_file = io.TextIOWrapper(export_file, encoding='utf-8', newline='')
+    if fmt == 'csv':
+        writer = csv.writer(text_file)
+        writer.writerow(["username", "template", "created_at"])
+    for username, template, created_at in user_data_store.iter_generations():
+        created_at = datetime.fromtimestamp(created_at, timezone.utc).isoformat()
+        if fmt == 'csv':
+            writer.writerow([username, template, created_at])
+        else:
+            text_file.write(json.dumps({"username": username, "template": template, "created_at": created_at}) + "\n")
+    text_file.flush()
+    text_file.detach()
+    export_file.seek(0)
+    return export_file
+
+
+async def handle_data_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handles the /data buttons: paging through users and exporting generation records."""
+    query = update.callback_query
+    await query.answer()
+    if str(query.from_user.id) != config.ADMIN_CHAT_ID:
+        return
+
+    if query.data.startswith('data_page_'):
+        page = int(query.data.rsplit('_', 1)[1])
+        page_size = config.DATA_PAGE_SIZE
+        # Fetch one extra row to know whether there is a next page
+        users = user_data_store.get_users_page(page * page_size, page_size + 1)
+        buttons = []
+        if page > 0:
+            buttons.append(InlineKeyboardButton("« Previous", callback_data=f'data_page_{page - 1}'))
+        if len(users) > page_size:
+            buttons.append(InlineKeyboardButton("Next »", callback_data=f'data_page_{page + 1}'))
+        text = f"Users who have generated a PDF (page {page + 1}):\n\n" + "\n".join(users[:page_size] or ["No users on this page."])
+        await query.edit_message_text(text, reply_markup=InlineKeyboardMarkup([buttons]) if buttons else None)
+
+    elif query.data.startswith('data_export_'):
+        fmt = query.data.rsplit('_', 1)[1]
+        user_data_store.flush()
+        export_file = await asyncio.to_thread(_export_generations, fmt)
+        with export_file:
+            await query.message.reply_document(document=export_file, filename=f"generations.{fmt}")
+
+
 async def telegram_webhook_handler(request: web.Request) -> web.Response:
     """Handle incoming Telegram updates by passing them to the bot application."""
     application = request.app["bot"]
+    dispatcher = request.app.get("dispatcher")
     try:
         data = await request.json()
         update = Update.de_json(data, application.bot)
-        await application.process_update(update)
+        if _recent_updates.seen(update.update_id):
+            logger.info(f"Ignoring duplicate update {update.update_id}.")
+            return web.Response()
+        if dispatcher is None:
+            _recent_updates.add(update.update_id)
+            await application.process_update(update)
+        elif dispatcher.submit(update):
+            _recent_updates.add(update.update_id)
+        else:
+            # Queue is full: make Telegram back off and redeliver later. The id is not
+            # recorded, so the redelivery is processed rather than dropped as a duplicate.
+            return web.Response(body=b"Too many pending updates", status=503, headers={"Retry-After": "5"})
         return web.Response()
     except json.JSONDecodeError:
         logger.error("Unable to parse JSON from Telegram update.")
@@ -499,6 +629,20 @@ async def health_check_handler(_: web.Request) -> web.Response:
     return web.Response(text="OK")
 
 
+async def metrics_handler(request: web.Request) -> web.Response:
+    """Reports cache and queue counters as JSON, for sizing and monitoring."""
+    return web.json_response({
+        "pdf_cache": pdf_cache.stats(),
+        "updates": request.app["dispatcher"].stats() if "dispatcher" in request.app else None,
+        "temp_files": temp_reaper.stats(),
+        "sessions": session_expiry.sessions.stats(),
+        "dedupe": {"duplicate_updates": _recent_updates.duplicates, "joined_generations": _generations.joined},
+        "gemini": gemini_client.scheduler.stats(),
+        "resume_parsing": gemini_client.get_parse_stats(),
+        "template_fast_path": template_parser.get_stats(),
+    })
+
+
 async def on_startup(app: web.Application):
     """
     Actions to take on application startup.
@@ -509,7 +653,20 @@ async def on_startup(app: web.Application):
     # Initialize Firebase
     firebase_client.initialize_firebase()
 
-    application = Application.builder().token(config.TELEGRAM_TOKEN).build()
+    # Compile the templates once (this also fills the on-disk bytecode cache
+    # the render workers load from), then start the PDF render workers
+    templating.precompile()
+    render_pool.start_pool()
+
+    # Keep conversation state and user_data in SQLite so sessions survive restarts
+    builder = Application.builder().token(config.TELEGRAM_TOKEN)
+    persistence = None
+    if config.SESSION_PERSISTENCE:
+        persistence = session_store.SqlitePersistence(
+            config.SESSION_DB_PATH, States, update_interval=config.SESSION_PERSIST_INTERVAL
+        )
+        builder = builder.persistence(persistence)
+    application = builder.build()
 
     # Conversation handler setup
     conv_handler = ConversationHandler(
@@ -526,41 +683,83 @@ async def on_startup(app: web.Application):
             States.AWAITING_REGENERATION: [MessageHandler(filters.Regex("^(🎨 Regenerate with New Design|✅ Finish)$"), handle_regeneration_choice)],
         },
         fallbacks=[CommandHandler("cancel", cancel), MessageHandler(filters.TEXT & ~filters.COMMAND, invalid_input)],
+        name="resume_conversation",
+        persistent=config.SESSION_PERSISTENCE,
     )
+    application.add_handler(TypeHandler(Update, touch_session), group=-1)
     application.add_handler(conv_handler)
     application.add_handler(CommandHandler("data", get_data))
+    application.add_handler(CallbackQueryHandler(handle_data_callback, pattern='^data_'))
 
     # Store the application instance in the aiohttp app context
     app["bot"] = application
     
-    # Schedule the cleanup job
-    application.job_queue.run_repeating(cleanup_old_files, interval=900, first=10) # 15 minutes
+    # Delete temporary files as they expire, sweep expired sessions, and flush buffered user data periodically
+    temp_reaper.start(adopt=(generator.PDF_FILE_PREFIX,))
+    application.job_queue.run_repeating(expire_sessions, interval=config.SESSION_SWEEP_INTERVAL)
+    application.job_queue.run_repeating(flush_user_data, interval=config.USER_DB_FLUSH_INTERVAL)
 
     # Initialize the bot, set the webhook, and start the bot
     await application.initialize()
+    if persistence is not None:
+        # Sessions restored from disk expire as if the bot had never restarted
+        for user_id, chat_id, last_active in persistence.active_sessions():
+            if workers.owns(chat_id):
+                session_expiry.sessions.start(user_id, chat_id, now=last_active)
+
+    # In multi-process mode the supervisor sets the webhook once for all workers
+    if config.WORKER_INDEX is None and not await set_webhook(application.bot):
+        return
+    await application.start()
+
+    # Acknowledge webhooks immediately and process updates from a bounded queue
+    if config.WEBHOOK_ASYNC_INGESTION:
+        dispatcher = update_queue.UpdateDispatcher(
+            application.process_update, workers=config.UPDATE_WORKERS, max_pending=config.UPDATE_QUEUE_SIZE
+        )
+        dispatcher.start()
+        app["dispatcher"] = dispatcher
+    logger.info("Bot started and webhook is set.")
+
+
+async def set_webhook(bot) -> bool:
+    """Points the Telegram webhook at this server. Returns False if WEBHOOK_URL is not set."""
     webhook_url = os.environ.get("WEBHOOK_URL", "").rstrip("/")
     if not webhook_url:
         logger.error("WEBHOOK_URL environment variable not set! Webhook not set.")
-        return
-        
-    await application.bot.set_webhook(
+        return False
+
+    await bot.set_webhook(
         url=f"{webhook_url}/{config.TELEGRAM_TOKEN}",
         allowed_updates=Update.ALL_TYPES,
         secret_token=config.SECRET_TOKEN
     )
-    await application.start()
-    logger.info("Bot started and webhook is set.")
+    return True
 
 
 async def on_shutdown(app: web.Application):
     """Actions to take on application shutdown."""
     logger.info("Shutting down the bot...")
+    if "dispatcher" in app:
+        await app["dispatcher"].stop()
     await app["bot"].stop()
     await app["bot"].shutdown()
+    await render_pool.shutdown_pool()
+    firebase_client.shutdown()
+    await temp_reaper.shutdown()
+    user_data_store.close()
     logger.info("Bot has been shut down.")
 
 
 if __name__ == "__main__":
+    # Get port from environment variables
+    port = int(os.environ.get("PORT", 8080))
+
+    if config.WEB_WORKERS > 1 and config.WORKER_INDEX is None:
+        # Supervisor: forwards each chat's updates to one of WEB_WORKERS copies of this script
+        workers.run_supervisor(os.path.abspath(__file__), port, set_webhook)
+        sys.exit(0)
+
     a_app = web.Application()
     
     # Register startup and shutdown handlers
@@ -570,9 +769,11 @@ if __name__ == "__main__":
     # Register webhook and health check handlers
     a_app.router.add_post(f"/{config.TELEGRAM_TOKEN}", telegram_webhook_handler)
     a_app.router.add_get("/health", health_check_handler)
+    a_app.router.add_get("/metrics", metrics_handler)
 
-    # Get port from environment variables
-    port = int(os.environ.get("PORT", 8080))
-    
-    logger.info(f"Starting aiohttp server on port {port}...")
-    web.run_app(a_app, host="0.0.0.0", port=port)
+    if config.WORKER_INDEX is not None:
+        logger.info(f"Starting worker {config.WORKER_INDEX} on {os.environ['WORKER_SOCKET']}...")
+        web.run_app(a_app, path=os.environ['WORKER_SOCKET'])
+    else:
+        logger.info(f"Starting aiohttp server on port {port}...")
+        web.run_app(a_app, host="0.0.0.0", port=port)
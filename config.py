@@ -1,5 +1,6 @@
 # config.py
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -30,3 +31,77 @@ TEMPLATES = {
     "template11": "resume_bot/templates/template11.html",
 }
 ACCENT_COLORS = ["#3498db", "#2ecc71", "#e74c3c", "#8e44ad"] # Blue, Green, Red, Purple
+
+# PDF rendering runs in a pool of worker processes so WeasyPrint layout never
+# blocks the event loop that serves the webhook.
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", os.cpu_count() or 1))
+RENDER_QUEUE_SIZE = int(os.getenv("RENDER_QUEUE_SIZE", 16)) # Jobs allowed to wait for a free worker
+RENDER_JOB_TIMEOUT = float(os.getenv("RENDER_JOB_TIMEOUT", 60)) # Seconds
+RENDER_MAX_JOBS_PER_WORKER = int(os.getenv("RENDER_MAX_JOBS_PER_WORKER", 50))
+RENDER_MAX_RSS_MB = int(os.getenv("RENDER_MAX_RSS_MB", 512))
+
+# Remote template assets (Google Fonts, Font Awesome) are served from this
+# on-disk cache. Populate it with `python asset_cache.py vendor`.
+ASSET_CACHE_DIR = os.getenv("ASSET_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "asset_cache"))
+ASSETS_OFFLINE = os.getenv("ASSETS_OFFLINE", "false").lower() == "true" # Never touch the network for assets
+
+# Root of the bot's temporary files: rendered PDFs, and the caches below by default.
+TEMP_DIR = os.path.join(tempfile.gettempdir(), "resume_bot")
+
+# Compiled template bytecode is persisted here so new processes skip compilation.
+TEMPLATE_BYTECODE_DIR = os.getenv("TEMPLATE_BYTECODE_DIR", os.path.join(TEMP_DIR, "jinja_cache"))
+TEMPLATE_AUTO_RELOAD = os.getenv("TEMPLATE_AUTO_RELOAD", "false").lower() == "true" # Pick up template edits without a restart
+
+# Rendered PDFs are cached by template and content. Backend is "memory", "disk" or "none".
+PDF_CACHE_BACKEND = os.getenv("PDF_CACHE_BACKEND", "memory").lower()
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", os.path.join(TEMP_DIR, "pdf_cache"))
+PDF_CACHE_MAX_MB = int(os.getenv("PDF_CACHE_MAX_MB", 64))
+PDF_CACHE_TTL = int(os.getenv("PDF_CACHE_TTL", 6 * 3600)) # Seconds
+PDF_SPILL_THRESHOLD_MB = float(os.getenv("PDF_SPILL_THRESHOLD_MB", 8)) # PDFs larger than this are buffered on disk instead of in memory
+TEMP_FILE_MAX_AGE = int(os.getenv("TEMP_FILE_MAX_AGE", 6 * 3600)) # Seconds before temporary PDFs and photos are deleted
+TEMP_REAPER_DB_PATH = os.getenv("TEMP_REAPER_DB_PATH", "temp_files.sqlite3") # Persisted expiry index of temporary files
+SESSION_TIMEOUT = int(os.getenv("SESSION_TIMEOUT", 6 * 3600)) # Seconds before a verified session expires
+SESSION_SLIDING = os.getenv("SESSION_SLIDING", "true").lower() == "true" # Count the timeout from the user's last update
+SESSION_SWEEP_INTERVAL = int(os.getenv("SESSION_SWEEP_INTERVAL", 60)) # Seconds between expiry sweeps (also the wheel's slot size)
+SESSION_PERSISTENCE = os.getenv("SESSION_PERSISTENCE", "true").lower() == "true" # Keep sessions across restarts
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.sqlite3")
+SESSION_PERSIST_INTERVAL = float(os.getenv("SESSION_PERSIST_INTERVAL", 5)) # Seconds between batched session writes
+
+# Opt-in: after a PDF is sent, render the next "Regenerate with New Design" PDF in the background.
+SPECULATIVE_RENDER = os.getenv("SPECULATIVE_RENDER", "false").lower() == "true"
+
+# Generated 'About Me' texts are memoized. Backend is "memory", "sqlite" or "none".
+ABOUT_ME_CACHE_BACKEND = os.getenv("ABOUT_ME_CACHE_BACKEND", "memory").lower()
+ABOUT_ME_CACHE_PATH = os.getenv("ABOUT_ME_CACHE_PATH", os.path.join(tempfile.gettempdir(), "resume_bot_about_me.sqlite3"))
+ABOUT_ME_CACHE_SIZE = int(os.getenv("ABOUT_ME_CACHE_SIZE", 1000)) # Entries
+ABOUT_ME_CACHE_TTL = int(os.getenv("ABOUT_ME_CACHE_TTL", 24 * 3600)) # Seconds
+
+# Gemini request scheduling. Defaults match the free tier of gemini-1.5-flash.
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", 4)) # Requests in flight at once
+GEMINI_REQUESTS_PER_MINUTE = int(os.getenv("GEMINI_REQUESTS_PER_MINUTE", 15))
+GEMINI_TOKENS_PER_MINUTE = int(os.getenv("GEMINI_TOKENS_PER_MINUTE", 1000000))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", 4)) # Retries on 429 and transient server errors
+GEMINI_COMBINED_EXTRACTION = os.getenv("GEMINI_COMBINED_EXTRACTION", "true").lower() == "true" # Parse and write 'About Me' in one request (needs the 'About Me' cache)
+
+# Firebase access. FIREBASE_BACKEND=fake uses an in-memory code store seeded from FAKE_VERIFICATION_CODES.
+FIREBASE_BACKEND = os.getenv("FIREBASE_BACKEND", "firebase").lower()
+FAKE_VERIFICATION_CODES = os.getenv("FAKE_VERIFICATION_CODES", "") # Comma-separated
+FIREBASE_MAX_WORKERS = int(os.getenv("FIREBASE_MAX_WORKERS", 8)) # Concurrent Firebase calls
+FIREBASE_TIMEOUT = float(os.getenv("FIREBASE_TIMEOUT", 10)) # Seconds per call
+
+# Store of users who generated PDFs. Writes are buffered and committed in batches.
+USER_DB_PATH = os.getenv("USER_DB_PATH", "generated_users.sqlite3")
+USER_DB_BATCH_SIZE = int(os.getenv("USER_DB_BATCH_SIZE", 20)) # Generations per write
+USER_DB_FLUSH_INTERVAL = int(os.getenv("USER_DB_FLUSH_INTERVAL", 30)) # Seconds
+DATA_PAGE_SIZE = int(os.getenv("DATA_PAGE_SIZE", 50)) # Users per /data page
+
+# Webhook ingestion: acknowledge updates immediately and process them from a bounded queue.
+WEBHOOK_ASYNC_INGESTION = os.getenv("WEBHOOK_ASYNC_INGESTION", "true").lower() == "true"
+UPDATE_WORKERS = int(os.getenv("UPDATE_WORKERS", 32)) # Chats processed concurrently
+UPDATE_QUEUE_SIZE = int(os.getenv("UPDATE_QUEUE_SIZE", 1000)) # Pending updates before the webhook answers 503
+UPDATE_DEDUPE_WINDOW = int(os.getenv("UPDATE_DEDUPE_WINDOW", 10000)) # Recent update ids remembered to drop redeliveries
+TEMPLATE_GALLERY_PATH = os.getenv("TEMPLATE_GALLERY_PATH", "template_gallery.json") # Telegram file_ids of uploaded template previews
+# Multi-process mode. Render workers and the Gemini quota are split between the bot processes.
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", 1)) # Bot processes behind the webhook port; above 1 a supervisor routes updates by chat
+WORKER_INDEX = int(os.environ["WORKER_INDEX"]) if "WORKER_INDEX" in os.environ else None # Set by the supervisor in its workers
+WORKER_SOCKET_DIR = os.getenv("WORKER_SOCKET_DIR", os.path.join(tempfile.gettempdir(), "resume_bot_workers"))
@@ -0,0 +1,64 @@
+"""
+Guards against doing the same work twice.
+
+RecentUpdateIds drops webhook updates Telegram redelivers, and SingleFlight makes
+concurrent requests for the same job (e.g. a double-tapped "Generate PDF" button)
+share one execution instead of each starting their own. SingleFlight only matters
+when updates of one chat can be processed concurrently, i.e. without the ordered
+update_queue dispatcher.
+"""
+import asyncio
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class RecentUpdateIds:
+    """Remembers the last `size` update ids seen, to detect redelivered updates."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.duplicates = 0
+        self._seen = OrderedDict()
+
+    def seen(self, update_id: int) -> bool:
+        """Whether the update id was accepted recently (the update is a duplicate)."""
+        if update_id in self._seen:
+            self.duplicates += 1
+            return True
+        return False
+
+    def add(self, update_id: int):
+        """Records an update id once the update has been accepted for processing."""
+        self._seen[update_id] = None
+        if len(self._seen) > self.size:
+            self._seen.popitem(last=False)
+
+
+class SingleFlight:
+    """Runs at most one job per key at a time; callers arriving meanwhile share its result."""
+
+    def __init__(self):
+        self.joined = 0
+        self._in_flight: dict = {}
+
+    async def run(self, key, make_job):
+        """
+        Runs `make_job()` for a key, or waits for the run already in flight for it.
+
+        Args:
+            key: Identifies the job, e.g. a user id.
+            make_job: A zero-argument callable returning the coroutine to run.
+        """
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.joined += 1
+            logger.info(f"Joining in-flight job for {key}.")
+            return await asyncio.shield(task)
+
+        task = asyncio.ensure_future(make_job())
+        self._in_flight[key] = task
+        # Forget the job when it finishes, even if every caller waiting on it was cancelled.
+        task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(task)
@@ -1,14 +1,55 @@
 import firebase_admin
 from firebase_admin import credentials, db
 import os
+import asyncio
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import config
 
 logger = logging.getLogger(__name__)
 
+# The Admin SDK is synchronous, so its calls run on this pool instead of the event loop.
+# Its threads share the SDK's HTTP session, which keeps connections to the database alive.
+_executor = ThreadPoolExecutor(max_workers=config.FIREBASE_MAX_WORKERS, thread_name_prefix="firebase")
+
+class FakeCodeStore:
+    """
+    An in-memory stand-in for the 'resumedb' codes, for tests and local development.
+    Enabled with FIREBASE_BACKEND=fake and seeded from FAKE_VERIFICATION_CODES.
+    """
+
+    def __init__(self, codes=()):
+        self._codes = set(codes)
+        self._lock = threading.Lock()
+
+    def add(self, code: str):
+        with self._lock:
+            self._codes.add(code)
+
+    def verify_and_delete(self, code: str, may_claim=None) -> bool:
+        with self._lock:
+            if code in self._codes and (may_claim is None or may_claim()):
+                self._codes.remove(code)
+                return True
+            return False
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+
+_fake_store = FakeCodeStore(c.strip() for c in config.FAKE_VERIFICATION_CODES.split(',') if c.strip())
+
+
 def initialize_firebase():
     """
     Initializes the Firebase Admin SDK using credentials from environment variables.
     """
+    if config.FIREBASE_BACKEND == 'fake':
+        logger.info(f"Using the in-memory fake Firebase backend with {len(_fake_store)} code(s).")
+        return
+
     try:
         # Check if the app is already initialized
         if not firebase_admin._apps:
@@ -32,20 +73,54 @@ def initialize_firebase():
 
             cred = credentials.Certificate(cred_json)
             firebase_admin.initialize_app(cred, {
-                'databaseURL': os.environ.get("FIREBASE_DATABASE_URL")
+                'databaseURL': os.environ.get("FIREBASE_DATABASE_URL"),
+                'httpTimeout': config.FIREBASE_TIMEOUT,
             })
             logger.info("Firebase app initialized successfully.")
     except Exception as e:
         logger.error(f"Failed to initialize Firebase: {e}")
 
 
-def verify_and_delete_code(code: str) -> bool:
+def _find_code(ref, code: str) -> str | None:
+    """
+    Looks up the push key of a code with an indexed query on its 'key' child,
+    so only the matching record is downloaded.
+
+    Requires '".indexOn": ["key"]' on 'resumedb' in the database rules; without it
+    the server falls back to filtering the whole node on every lookup.
+    """
+    matches = ref.order_by_child('key').equal_to(code).limit_to_first(1).get()
+    if not matches:
+        return None
+    return next(iter(matches))
+
+
+def _claim_code(ref, push_key: str, code: str) -> bool:
+    """
+    Deletes a code record in a transaction, so that when two users redeem the same
+    code at once exactly one of them succeeds.
+    """
+    claimed = False
+
+    def delete_if_unclaimed(current):
+        nonlocal claimed
+        claimed = isinstance(current, dict) and current.get('key') == code
+        # Returning None deletes the record; returning it unchanged leaves it alone.
+        return None if claimed else current
+
+    ref.child(push_key).transaction(delete_if_unclaimed)
+    return claimed
+
+
+def verify_and_delete_code(code: str, may_claim=None) -> bool:
     """
     Verifies a code against the 'resumedb' path in Firebase Realtime Database.
     If the code exists, it deletes it and returns True. Otherwise, returns False.
 
     Args:
         code: The verification code to check.
+        may_claim: Optional callable asked once the code is found; if it returns False
+            the code is left alone (the caller has given up waiting).
 
     Returns:
         True if the code was valid and deleted, False otherwise.
@@ -56,21 +131,64 @@ def verify_and_delete_code(code: str) -> bool:
 
     try:
         ref = db.reference('resumedb')
-        all_codes = ref.get()
+        push_key = _find_code(ref, code)
 
-        if not all_codes:
-            logger.warning("No codes found in the database.")
+        if push_key is None:
+            logger.info(f"Verification code '{code}' not found.")
             return False
 
-        for push_key, data in all_codes.items():
-            if isinstance(data, dict) and data.get('key') == code:
-                # Code found, delete it from the database
-                ref.child(push_key).delete()
-                logger.info(f"Verification code '{code}' successful. Key '{push_key}' deleted.")
-                return True
+        if may_claim is not None and not may_claim():
+            logger.info(f"Verification of code '{code}' was abandoned before redeeming it.")
+            return False
 
-        logger.info(f"Verification code '{code}' not found.")
-        return False
+        if not _claim_code(ref, push_key, code):
+            logger.info(f"Verification code '{code}' was already redeemed.")
+            return False
+
+        logger.info(f"Verification code '{code}' successful. Key '{push_key}' deleted.")
+        return True
     except Exception as e:
         logger.error(f"Error during Firebase code verification: {e}")
         return False
+
+
+async def verify_code(code: str) -> bool:
+    """
+    Verifies and redeems a code without blocking the event loop.
+
+    The work runs on the Firebase thread pool. If the code has not been found within
+    FIREBASE_TIMEOUT the verification fails and the worker thread is told not to
+    redeem it. Once redemption has started it is always awaited, since abandoning it
+    could delete a code the user was told is invalid; each of the transaction's
+    requests is still bounded by the SDK's httpTimeout.
+    """
+    if config.FIREBASE_BACKEND == 'fake':
+        verify = _fake_store.verify_and_delete
+    else:
+        verify = verify_and_delete_code
+
+    lock = threading.Lock()
+    state = {'claiming': False, 'abandoned': False}
+
+    def may_claim() -> bool:
+        with lock:
+            state['claiming'] = not state['abandoned']
+            return state['claiming']
+
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_executor, verify, code, may_claim)
+    try:
+        return await asyncio.wait_for(asyncio.shield(future), config.FIREBASE_TIMEOUT)
+    except asyncio.TimeoutError:
+        with lock:
+            state['abandoned'] = not state['claiming']
+        if state['abandoned']:
+            logger.error(f"Firebase code verification timed out after {config.FIREBASE_TIMEOUT}s.")
+            return False
+        logger.warning(f"Code '{code}' is being redeemed after {config.FIREBASE_TIMEOUT}s; waiting for it to finish.")
+        return await future
+
+
+def shutdown():
+    """Stops the Firebase thread pool, letting in-flight calls finish in the background."""
+    _executor.shutdown(wait=False, cancel_futures=True)
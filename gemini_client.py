@@ -1,9 +1,15 @@
 import google.generativeai as genai
+import config
 from config import GEMINI_API_KEY
 import logging
 import json
 import re
-import asyncio
+import hashlib
+
+from ttl_cache import MemoryTTLCache, SqliteTTLCache
+from gemini_scheduler import GeminiScheduler, PRIORITY_INTERACTIVE, Priority
+import resume_schema
+import template_parser
 
 def clean_markdown(text: str) -> str:
     """Removes common markdown formatting characters from a string."""
@@ -26,30 +32,102 @@ def clean_data_recursively(data):
     else:
         return data
 
+MODEL_NAME = "gemini-1.5-flash-latest"
+
 # Configure the Gemini API client
 try:
     genai.configure(api_key=GEMINI_API_KEY)
-    model = genai.GenerativeModel("gemini-1.5-flash-latest")
+    model = genai.GenerativeModel(MODEL_NAME)
 except Exception as e:
     logging.error(f"Failed to configure Gemini: {e}")
     model = None
 
-async def generate_about_me(user_data: dict) -> str | None:
+# All model calls share one scheduler so bursts of users queue up instead of hitting 429s.
+# In multi-process mode every worker gets an equal share of the quota.
+_quota_share = config.WEB_WORKERS if config.WORKER_INDEX is not None else 1
+scheduler = GeminiScheduler(
+    max_in_flight=config.GEMINI_MAX_CONCURRENCY,
+    requests_per_minute=config.GEMINI_REQUESTS_PER_MINUTE / _quota_share,
+    tokens_per_minute=config.GEMINI_TOKENS_PER_MINUTE / _quota_share,
+    max_retries=config.GEMINI_MAX_RETRIES,
+)
+
+async def _generate(prompt: str, priority: int | Priority, expected_output_tokens: int, **request_kwargs):
+    """Sends a prompt to the model through the shared scheduler."""
+    # Roughly four characters per token is close enough for rate limiting.
+    estimated_tokens = len(prompt) // 4 + expected_output_tokens
+    return await scheduler.run(
+        lambda: model.generate_content_async(prompt, **request_kwargs), estimated_tokens, priority, label=MODEL_NAME
+    )
+
+# Outcome of every resume parse, per model: clean, repaired locally, or failed.
+parse_stats: dict[str, dict[str, int]] = {}
+
+def _record_parse(outcome: str):
+    counters = parse_stats.setdefault(MODEL_NAME, {'parses': 0, 'repaired': 0, 'failed': 0})
+    counters['parses'] += 1
+    if outcome != 'ok':
+        counters[outcome] += 1
+
+def get_parse_stats() -> dict:
+    """Returns parse counters and failure rates per model, with the scheduler's retry counts."""
+    request_stats = scheduler.stats()['by_label']
+    stats = {}
+    for model_name, counters in parse_stats.items():
+        stats[model_name] = dict(
+            counters,
+            failure_rate=round(counters['failed'] / counters['parses'], 3) if counters['parses'] else 0.0,
+            request_retries=request_stats.get(model_name, {}).get('retries', 0),
+        )
+    return stats
+
+# 'About Me' texts are memoized by a hash of the resume fields the prompt is built from.
+if config.ABOUT_ME_CACHE_BACKEND == 'sqlite':
+    about_me_cache = SqliteTTLCache(config.ABOUT_ME_CACHE_PATH, config.ABOUT_ME_CACHE_SIZE, config.ABOUT_ME_CACHE_TTL, table='about_me')
+elif config.ABOUT_ME_CACHE_BACKEND == 'memory':
+    about_me_cache = MemoryTTLCache(config.ABOUT_ME_CACHE_SIZE, config.ABOUT_ME_CACHE_TTL)
+else:
+    about_me_cache = None
+
+def _about_me_resume_text(user_data: dict) -> str:
+    """Builds the resume summary the 'About Me' prompt is based on."""
+    return f"""
+    Name: {user_data.get('name', '')}
+    Skills: {', '.join(str(skill.get('name') or '') for skill in user_data.get('skills') or [] if isinstance(skill, dict))}
+    Experience: {' | '.join(str(exp) for exp in user_data.get('experience') or [] if exp)}
+    Education: {' | '.join(str(edu) for edu in user_data.get('education') or [] if edu)}
+    """
+
+def about_me_cache_key(user_data: dict) -> str:
+    """Returns the memoization key for a user's 'About Me' text."""
+    return hashlib.sha256(_about_me_resume_text(user_data).encode('utf-8')).hexdigest()
+
+def invalidate_about_me(cache_key: str):
+    """Drops a memoized 'About Me' text, e.g. after the user edited a field it was built from."""
+    if about_me_cache is not None:
+        about_me_cache.delete(cache_key)
+
+async def generate_about_me(user_data: dict, priority: int | Priority = PRIORITY_INTERACTIVE) -> str | None:
     """
     Generates a short 'About Me' section based on the user's resume data.
+
+    Results are memoized, so regenerating a resume with unchanged data does not
+    cost another Gemini call. Prefetches pass a background Priority so they never
+    delay a user who is waiting on a parse, and escalate it once someone waits on them.
     """
+    # Construct a string representation of the user's current resume
+    resume_text = _about_me_resume_text(user_data)
+    cache_key = hashlib.sha256(resume_text.encode('utf-8')).hexdigest()
+    if about_me_cache is not None:
+        cached = about_me_cache.get(cache_key)
+        if cached is not None:
+            logging.info("Using memoized 'About Me' text.")
+            return cached
+
     if not model:
         logging.warning("Gemini model not available. Skipping 'About Me' generation.")
         return None
 
-    # Construct a string representation of the user's current resume
-    resume_text = f"""
-    Name: {user_data.get('name', '')}
-    Skills: {', '.join(skill['name'] for skill in user_data.get('skills', []))}
-    Experience: {' | '.join(user_data.get('experience', []))}
-    Education: {' | '.join(user_data.get('education', []))}
-    """
-
     prompt = (
         "You are a professional resume writer. Based on the following resume data, write a short, engaging 'About Me' section. "
         "It must be a short biography and limited to 50 words. "
@@ -59,20 +137,62 @@ async def generate_about_me(user_data: dict) -> str | None:
     )
 
     try:
-        response = await model.generate_content_async(prompt)
-        return clean_markdown(response.text.strip())
+        response = await _generate(prompt, priority, expected_output_tokens=100)
+        about_me = clean_markdown(response.text.strip())
+        if about_me_cache is not None and about_me:
+            about_me_cache.put(cache_key, about_me)
+        return about_me
     except Exception as e:
         logging.error(f"Gemini API call failed for 'About Me' generation: {e}")
         return None
 
+# Longest combined-mode 'About Me' accepted; the prompt asks for 50 words.
+_MAX_ABOUT_ME_WORDS = 80
+
+def _remember_combined_about_me(parsed_data: dict, about_me) -> bool:
+    """
+    Stores an 'About Me' text returned alongside the parsed fields in the memo cache,
+    so the later generate_about_me call for this data is answered without a request.
+
+    Returns:
+        Whether the text was usable.
+    """
+    if not isinstance(about_me, str) or not about_me.strip():
+        return False
+    about_me = clean_markdown(about_me.strip())
+    if len(about_me.split()) > _MAX_ABOUT_ME_WORDS or about_me_cache is None:
+        return False
+    about_me_cache.put(about_me_cache_key(parsed_data), about_me)
+    return True
+
 async def parse_resume_from_template(text: str) -> dict | None:
     """
     Parses a single block of text based on a template to extract structured resume data using Gemini.
+
+    In combined mode (GEMINI_COMBINED_EXTRACTION) the same request also writes the
+    'About Me' section, saving the separate round-trip generate_about_me would make.
+    The text is not returned; it seeds the 'About Me' cache instead, and
+    generate_about_me falls back to its own request if it was missing or invalid.
+
+    Submissions that follow RESUME_TEMPLATE exactly are parsed locally and never
+    reach the model.
     """
+    parsed_data = template_parser.parse_template(text)
+    if parsed_data is not None:
+        logging.info("Parsed resume locally from the template format.")
+        return parsed_data
+
     if not model:
         logging.warning("Gemini model not available. Skipping parsing.")
         return None
 
+    combined = config.GEMINI_COMBINED_EXTRACTION and about_me_cache is not None
+    about_me_instruction = (
+        "Also include an 'about_me' key: a short, engaging 'About Me' section written by a professional resume writer from the extracted data. "
+        "It must be a short biography limited to 50 words, focused on the key skills and experience, professional but personable, and without markdown.\n\n"
+        if combined else ""
+    )
+
     prompt = (
         "You are an expert data extraction assistant. From the following text, which is based on a template, extract the user's details. The fields to extract are:\n"
         "- Name\n"
@@ -88,25 +208,95 @@ async def parse_resume_from_template(text: str) -> dict | None:
         "- A list of education entries\n\n"
         "Return the data as a JSON object with the following keys: 'name', 'birthday', 'email', 'phone', 'website', 'address', 'language', 'nic_number', 'skills' (as a list of objects with 'name' and 'rating' keys), 'experience' (as a list of strings), and 'education' (as a list of strings).\n\n"
         "If a piece of information is not available, set its value to null. Be flexible with the input format, as users might not follow the template perfectly.\n\n"
+        f"{about_me_instruction}"
         f"Text to parse:\n---\n{text}\n---"
     )
 
     try:
-        response = await model.generate_content_async(prompt)
-        # Clean up the response to ensure it's valid JSON
-        clean_response = response.text.strip().replace("```json", "").replace("```", "").strip()
+        # Ask for JSON constrained to the resume schema rather than free-form text
+        response = await _generate(
+            prompt, PRIORITY_INTERACTIVE, expected_output_tokens=700 if combined else 600,
+            generation_config=genai.GenerationConfig(
+                response_mime_type="application/json",
+                response_schema=resume_schema.response_schema(include_about_me=combined),
+            ),
+        )
 
-        # Log the raw and cleaned response for debugging
+        # Log the raw response for debugging
         logging.info(f"Gemini raw response for parsing: {response.text}")
-        logging.info(f"Gemini cleaned response for parsing: {clean_response}")
 
-        parsed_data = json.loads(clean_response)
-        return clean_data_recursively(parsed_data)
+        raw_data = resume_schema.load_json(response.text)
+        about_me = raw_data.pop('about_me', None) if isinstance(raw_data, dict) else None
+        parsed_data = resume_schema.normalize_resume(clean_data_recursively(raw_data))
+        if parsed_data is None:
+            logging.error(f"Gemini response is not a resume: {response.text}")
+            _record_parse('failed')
+            return None
+        # Anything the schema normalization had to change counts as a local repair.
+        _record_parse('ok' if parsed_data == {k: raw_data.get(k) for k in parsed_data} else 'repaired')
+
+        if combined and not _remember_combined_about_me(parsed_data, about_me):
+            logging.info("Combined response had no usable 'About Me'; it will be generated separately.")
+        return parsed_data
 
     except json.JSONDecodeError as e:
         logging.error(f"Failed to decode JSON from Gemini response: {e}")
-        logging.error(f"Response that failed parsing: {clean_response}")
+        logging.error(f"Response that failed parsing: {response.text}")
+        _record_parse('failed')
         return None
     except Exception as e:
         logging.error(f"Gemini API call failed for data parsing: {e}")
+        _record_parse('failed')
+        return None
+
+_SECTION_PROMPTS = {
+    'personal': "the user's personal details. Use only these keys, and include only the ones the text mentions: "
+                "'name', 'birthday', 'email', 'phone', 'website', 'address', 'language', 'nic_number'",
+    'experience': "the user's work experiences, as a JSON object with an 'experience' key holding a list of strings, "
+                  "each formatted as 'Job Title, Company, Start Date - End Date, Description'",
+    'education': "the user's education entries, as a JSON object with an 'education' key holding a list of strings, "
+                 "each formatted as 'Degree, University, Graduation Year'",
+    'skills': "the user's skills, as a JSON object with a 'skills' key holding a list of objects with 'name' and "
+              "'rating' keys, where rating is an integer proficiency from 1 to 5",
+}
+
+async def parse_resume_section(section: str, text: str) -> dict | None:
+    """
+    Parses an edit of a single resume section ('personal', 'experience', 'education' or 'skills').
+
+    The text is parsed locally first; only ambiguous input is sent to Gemini, with a
+    short prompt and schema covering just that section rather than the whole resume.
+
+    Returns:
+        The fields of that section to merge into the user's data, or None if nothing usable was found.
+    """
+    updates = template_parser.parse_section(section, text)
+    if updates is not None:
+        return updates
+
+    if not model:
+        logging.warning("Gemini model not available. Skipping section parsing.")
+        return None
+
+    prompt = (
+        f"You are an expert data extraction assistant. From the following text, extract {_SECTION_PROMPTS[section]}. "
+        "Be flexible with the input format.\n\n"
+        f"Text to parse:\n---\n{text}\n---"
+    )
+
+    try:
+        response = await _generate(
+            prompt, PRIORITY_INTERACTIVE, expected_output_tokens=200,
+            generation_config=genai.GenerationConfig(
+                response_mime_type="application/json",
+                response_schema=resume_schema.section_schema(section),
+            ),
+        )
+        logging.info(f"Gemini raw response for '{section}' section: {response.text}")
+        return resume_schema.normalize_section(section, clean_data_recursively(resume_schema.load_json(response.text)))
+    except json.JSONDecodeError as e:
+        logging.error(f"Failed to decode JSON from Gemini section response: {e}")
+        return None
+    except Exception as e:
+        logging.error(f"Gemini API call failed for '{section}' section parsing: {e}")
         return None
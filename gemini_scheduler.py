@@ -0,0 +1,192 @@
+"""
+Admission control for Gemini API calls.
+
+Every model request goes through one GeminiScheduler, which caps the number of
+requests in flight, keeps the request and token rates under the per-minute quota
+with token buckets, serves interactive work before background work, and retries
+rate-limit and transient server errors with jittered exponential backoff.
+"""
+import time
+import heapq
+import random
+import asyncio
+import logging
+import itertools
+
+from google.api_core import exceptions as api_exceptions
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0 # The user is waiting on the answer (e.g. parsing their resume)
+PRIORITY_BACKGROUND = 1 # Prefetches and other work nobody is waiting on yet
+_LANE_NAMES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_BACKGROUND: 'background'}
+
+RETRYABLE_ERRORS = (
+    api_exceptions.ResourceExhausted, # 429
+    api_exceptions.ServiceUnavailable, # 503
+    api_exceptions.InternalServerError, # 500
+    api_exceptions.DeadlineExceeded, # 504
+    asyncio.TimeoutError,
+)
+
+
+class Priority:
+    """A priority that can be raised while its request waits; see GeminiScheduler.escalate."""
+
+    def __init__(self, value: int):
+        self.value = value
+
+
+class TokenBucket:
+    """A bucket refilled continuously at `per_minute` units per minute, holding at most one minute's worth."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def time_until(self, amount: float) -> float:
+        """Seconds until `amount` units are available (requests above capacity wait for a full bucket)."""
+        self._refill()
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+    def consume(self, amount: float):
+        self._refill()
+        self.level -= amount
+
+
+class GeminiScheduler:
+    """Schedules Gemini calls under a concurrency cap, rate limits and priority lanes."""
+
+    def __init__(self, max_in_flight: int, requests_per_minute: int, tokens_per_minute: int,
+                 max_retries: int = 4, base_delay: float = 1.0, max_delay: float = 30.0):
+        self.max_in_flight = max_in_flight
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._requests = TokenBucket(requests_per_minute)
+        self._tokens = TokenBucket(tokens_per_minute)
+        self._waiters = [] # heap of (priority, seq, estimated tokens, future, Priority or None)
+        self._seq = itertools.count()
+        self._wakeup = None
+        self.in_flight = 0
+        self.completed = 0
+        self.retries = 0
+        self.failures = 0
+        self._by_label = {} # label -> request, retry and failure counts
+
+    async def run(self, make_request, estimated_tokens: int = 0, priority: int | Priority = PRIORITY_INTERACTIVE,
+                  label: str = 'default'):
+        """
+        Runs a Gemini request once the scheduler admits it, retrying retryable errors.
+
+        Args:
+            make_request: A zero-argument callable returning a fresh awaitable for each attempt.
+            estimated_tokens: Expected prompt plus response tokens, charged to the token bucket.
+            priority: PRIORITY_INTERACTIVE or PRIORITY_BACKGROUND, or a Priority that
+                may be escalated while the request waits.
+            label: Name (e.g. the model) the request is counted under in stats().
+        """
+        counters = self._by_label.setdefault(label, {'requests': 0, 'retries': 0, 'failures': 0})
+        counters['requests'] += 1
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(priority, estimated_tokens)
+            try:
+                result = await make_request()
+                self.completed += 1
+                return result
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    self.failures += 1
+                    counters['failures'] += 1
+                    raise
+                self.retries += 1
+                counters['retries'] += 1
+                delay = min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.5)
+                logger.warning(f"Gemini request failed ({e.__class__.__name__}), retrying in {delay:.1f}s.")
+            except Exception:
+                self.failures += 1
+                counters['failures'] += 1
+                raise
+            finally:
+                self._release()
+            await asyncio.sleep(delay)
+
+    async def _acquire(self, priority: int | Priority, tokens: int):
+        future = asyncio.get_running_loop().create_future()
+        if isinstance(priority, Priority):
+            entry = (priority.value, next(self._seq), tokens, future, priority)
+        else:
+            entry = (priority, next(self._seq), tokens, future, None)
+        heapq.heappush(self._waiters, entry)
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just as we were cancelled: give the slot back.
+                self._release()
+            raise
+
+    def escalate(self, priority: Priority, value: int = PRIORITY_INTERACTIVE):
+        """
+        Raises a Priority, moving its waiting request (and any retry of it) to the
+        given lane, e.g. when a user starts waiting on a prefetch.
+        """
+        if value >= priority.value:
+            return
+        priority.value = value
+        self._waiters = [
+            (value, *entry[1:]) if entry[4] is priority else entry for entry in self._waiters
+        ]
+        heapq.heapify(self._waiters)
+        self._dispatch()
+
+    def _release(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        """Admits waiters in priority order while there is a free slot and quota."""
+        while self._waiters and self.in_flight < self.max_in_flight:
+            _, _, tokens, future, _ = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+
+            wait = max(self._requests.time_until(1), self._tokens.time_until(tokens))
+            if wait > 0:
+                if self._wakeup is None:
+                    self._wakeup = asyncio.get_running_loop().call_later(wait, self._on_wakeup)
+                return
+
+            heapq.heappop(self._waiters)
+            self._requests.consume(1)
+            self._tokens.consume(tokens)
+            self.in_flight += 1
+            future.set_result(None)
+
+    def _on_wakeup(self):
+        self._wakeup = None
+        self._dispatch()
+
+    def stats(self) -> dict:
+        queued = {name: 0 for name in _LANE_NAMES.values()}
+        for priority, _, _, future, _ in self._waiters:
+            if not future.done():
+                queued[_LANE_NAMES.get(priority, str(priority))] += 1
+        return {
+            'in_flight': self.in_flight,
+            'queued': queued,
+            'completed': self.completed,
+            'retries': self.retries,
+            'failures': self.failures,
+            'by_label': self._by_label,
+        }
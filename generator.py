@@ -2,14 +2,89 @@ import os
 import uuid
 import logging
 import random
+import tempfile
 from pathlib import Path
-from jinja2 import Environment, FileSystemLoader
-from weasyprint import HTML
+from typing import BinaryIO
 
 import gemini_client
-from config import TEMPLATES
+import render_pool
+import pdf_cache
+import temp_reaper
+from config import TEMPLATES, PDF_SPILL_THRESHOLD_MB, TEMP_DIR
 
-async def generate_pdf(user_data: dict, selected_template: str = None, exclude_template: str = None) -> tuple[str, str] | None:
+PDF_OUTPUT_DIR = os.path.join(TEMP_DIR, "pdfs")
+PDF_FILE_PREFIX = os.path.join(PDF_OUTPUT_DIR, "resume_")
+
+def select_template(selected_template: str = None, exclude_template: str = None) -> str:
+    """
+    Picks the template to render: the selected one if valid, otherwise a random one.
+    A regeneration (exclude_template set) always picks a random template other than
+    the excluded one, even if the user selected a template earlier.
+
+    Args:
+        selected_template: The name of a specific template to use.
+        exclude_template: The name of a template to exclude from random selection.
+    """
+    if exclude_template is None and selected_template and selected_template in TEMPLATES:
+        return selected_template
+
+    available_templates = list(TEMPLATES.keys())
+    if exclude_template and exclude_template in available_templates:
+        available_templates.remove(exclude_template)
+
+    if not available_templates:
+        # Fallback if all templates were excluded (e.g., only one exists)
+        available_templates = list(TEMPLATES.keys())
+
+    return random.choice(available_templates)
+
+async def _render(template_name: str, render_context: dict, low_priority: bool = False) -> bytes:
+    """Renders a template to PDF bytes, using the PDF cache."""
+    # The loader's search path is the templates dir, so we just need the filename
+    template_filename = os.path.basename(TEMPLATES[template_name])
+
+    # Render the template and convert it to PDF in a worker process, off the event loop,
+    # unless an identical PDF was rendered recently
+    cache = pdf_cache.get_cache()
+    cache_key = pdf_cache.make_key(template_filename, render_context) if cache else None
+    pdf_bytes = await cache.get(cache_key) if cache else None
+    if pdf_bytes is None:
+        pdf_bytes = await render_pool.get_pool().render(template_filename, render_context, low_priority=low_priority)
+        if cache:
+            await cache.put(cache_key, pdf_bytes)
+    else:
+        logging.info(f"Serving cached PDF for template: {template_name}")
+    return pdf_bytes
+
+def _to_file(pdf_bytes: bytes) -> str:
+    """Writes a PDF to a temporary file and returns its path."""
+    os.makedirs(PDF_OUTPUT_DIR, exist_ok=True)
+    pdf_path = f"{PDF_FILE_PREFIX}{uuid.uuid4()}.pdf"
+    with open(pdf_path, 'wb') as f:
+        f.write(pdf_bytes)
+    temp_reaper.register(pdf_path)
+    return pdf_path
+
+def _to_stream(pdf_bytes: bytes) -> tempfile.SpooledTemporaryFile:
+    """
+    Wraps a PDF in a file object, positioned at the start, that stays in memory up to
+    PDF_SPILL_THRESHOLD_MB and spills to an anonymous temporary file beyond that.
+    Nothing is left on disk once the stream is closed or garbage collected.
+    """
+    os.makedirs(PDF_OUTPUT_DIR, exist_ok=True)
+    # max_size=0 would mean "never spill", so a threshold of 0 spills everything.
+    max_size = max(1, int(PDF_SPILL_THRESHOLD_MB * 1024 * 1024))
+    stream = tempfile.SpooledTemporaryFile(max_size=max_size, dir=PDF_OUTPUT_DIR)
+    stream.write(pdf_bytes)
+    stream.seek(0)
+    return stream
+
+async def _render_output(template_name: str, render_context: dict, stream: bool, low_priority: bool = False):
+    pdf_bytes = await _render(template_name, render_context, low_priority=low_priority)
+    return _to_stream(pdf_bytes) if stream else _to_file(pdf_bytes)
+
+async def generate_pdf(user_data: dict, selected_template: str = None, exclude_template: str = None, about_me: str = None,
+                       stream: bool = False) -> tuple[str | BinaryIO, str] | None:
     """
     Generates a PDF resume from user data and a template.
 
@@ -17,43 +92,25 @@ async def generate_pdf(user_data: dict, selected_template: str = None, exclude_t
         user_data: A dictionary containing all the user's information.
         selected_template: The name of a specific template to use.
         exclude_template: The name of a template to exclude from random selection.
+        about_me: An already generated 'About Me' text. If omitted, one is generated.
+        stream: Return the PDF as a file object (see _to_stream) instead of writing it to a
+            temporary file. The caller must close it.
 
     Returns:
-        A tuple containing the file path of the generated PDF and the template name used,
-        or None if an error occurs.
+        A tuple containing the file path (or file object) of the generated PDF and the
+        template name used, or None if an error occurs.
+
+    Raises:
+        render_pool.RenderQueueFull, render_pool.RenderTimeout: If the renderer is too
+            busy; the request can be retried, unlike the failures reported as None.
     """
     try:
-        # Get the absolute path of the directory containing this script (resume_bot/)
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-
-        # The templates directory is a subdirectory of the script's directory
-        templates_dir = os.path.join(script_dir, 'templates')
-
-        # 1. Set up Jinja2 environment with a reliable path to the templates directory
-        env = Environment(loader=FileSystemLoader(templates_dir))
-
-        # 2. Select a template
-        if selected_template and selected_template in TEMPLATES:
-            template_name = selected_template
-        else:
-            available_templates = list(TEMPLATES.keys())
-            if exclude_template and exclude_template in available_templates:
-                available_templates.remove(exclude_template)
-
-            if not available_templates:
-                # Fallback if all templates were excluded (e.g., only one exists)
-                available_templates = list(TEMPLATES.keys())
-
-            template_name = random.choice(available_templates)
-        template_path = TEMPLATES[template_name]
+        # 1. Select a template
+        template_name = select_template(selected_template, exclude_template)
         logging.info(f"Randomly selected template: {template_name}")
 
-        # The loader's search path is now the templates dir, so we just need the filename
-        template_filename = os.path.basename(template_path)
-        template = env.get_template(template_filename)
-
-        # 3. Generate 'About Me' text and render the HTML template with user data
-        about_me_text = await gemini_client.generate_about_me(user_data)
+        # 2. Generate 'About Me' text for the template
+        about_me_text = about_me or await gemini_client.generate_about_me(user_data)
         if about_me_text:
             user_data['about_me'] = about_me_text
 
@@ -65,19 +122,33 @@ async def generate_pdf(user_data: dict, selected_template: str = None, exclude_t
         if 'photo_path' in user_data and user_data.get('photo_path') and os.path.exists(user_data['photo_path']):
             user_data['photo_path'] = Path(os.path.abspath(user_data['photo_path'])).as_uri()
 
-        html_out = template.render(user_data)
+        # 3. Render the PDF
+        pdf = await _render_output(template_name, dict(user_data), stream)
 
-        # 4. Create a temporary output file path
-        output_dir = "/tmp/resume_bot/pdfs"
-        os.makedirs(output_dir, exist_ok=True)
-        pdf_path = os.path.join(output_dir, f"resume_{uuid.uuid4()}.pdf")
+        return pdf, template_name
 
-        # 5. Call WeasyPrint to convert HTML to PDF
-        # The base_url should be the templates directory to resolve any relative asset paths
-        HTML(string=html_out, base_url=templates_dir).write_pdf(pdf_path)
+    except (render_pool.RenderQueueFull, render_pool.RenderTimeout):
+        raise
+    except Exception as e:
+        logging.error(f"Error generating PDF: {e}")
+        return None
 
-        return pdf_path, template_name
+async def prerender_pdf(user_data: dict, template_name: str, stream: bool = False) -> str | BinaryIO | None:
+    """
+    Speculatively renders a PDF with the data of a previous successful render.
 
+    Unlike generate_pdf this never calls Gemini (the 'About Me' text from the
+    previous render is reused) and only runs on an idle render worker.
+
+    Returns:
+        The file path (or file object, with stream=True) of the generated PDF, or None
+        if it could not be rendered.
+    """
+    try:
+        return await _render_output(template_name, dict(user_data), stream, low_priority=True)
+    except render_pool.RenderQueueFull:
+        logging.info(f"Skipped pre-rendering '{template_name}': no idle render worker.")
+        return None
     except Exception as e:
-        logging.error(f"Error generating PDF: {e}")
+        logging.error(f"Error pre-rendering PDF: {e}")
         return None
@@ -0,0 +1,232 @@
+"""
+Content-addressed cache of rendered PDFs.
+
+A PDF is fully determined by the template (name and file version) and the values
+of the variables that template reads, so the cache key is a hash of exactly those.
+Session bookkeeping in user_data (attempt counters, flags) never causes a miss.
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+
+from jinja2 import meta
+
+import config
+import templating
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBackend:
+    """Keeps cached PDFs in process memory."""
+
+    blocking = False # Whether calls do I/O and must run off the event loop
+
+    def __init__(self):
+        self._entries = OrderedDict()  # key -> (created_at, pdf_bytes)
+
+    def get(self, key: str) -> tuple[float, bytes] | None:
+        return self._entries.get(key)
+
+    def put(self, key: str, created_at: float, pdf_bytes: bytes):
+        self._entries[key] = (created_at, pdf_bytes)
+
+    def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    def scan(self) -> list[tuple[str, float, int]]:
+        return []
+
+
+class DiskBackend:
+    """Keeps cached PDFs as files named by their key, so they survive restarts."""
+
+    blocking = True
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def get(self, key: str) -> tuple[float, bytes] | None:
+        path = self._path(key)
+        try:
+            created_at = os.path.getmtime(path)
+            with open(path, 'rb') as f:
+                return created_at, f.read()
+        except OSError:
+            return None
+
+    def put(self, key: str, created_at: float, pdf_bytes: bytes):
+        tmp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(pdf_bytes)
+        os.replace(tmp_path, self._path(key))
+
+    def delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def scan(self) -> list[tuple[str, float, int]]:
+        """Lists the (key, created_at, size) of every PDF already on disk, oldest first."""
+        entries = []
+        for filename in os.listdir(self.directory):
+            if filename.endswith('.pdf'):
+                path = os.path.join(self.directory, filename)
+                try:
+                    entries.append((filename[:-4], os.path.getmtime(path), os.path.getsize(path)))
+                except OSError:
+                    continue
+        return sorted(entries, key=lambda entry: entry[1])
+
+
+class PdfCache:
+    """A size-bounded LRU of rendered PDFs with TTL expiry and hit/miss counters."""
+
+    def __init__(self, backend, max_bytes: int, ttl: float):
+        self.backend = backend
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._sizes = OrderedDict()  # key -> size in bytes, least recently used first
+        self._total_bytes = 0
+        for key, created_at, size in backend.scan():
+            if time.time() - created_at < ttl:
+                self._sizes[key] = size
+                self._total_bytes += size
+            else:
+                backend.delete(key)
+
+    async def _call(self, method, *args):
+        if self.backend.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def get(self, key: str) -> bytes | None:
+        entry = await self._call(self.backend.get, key) if key in self._sizes else None
+        if entry is None or time.time() - entry[0] >= self.ttl:
+            if key in self._sizes:
+                await self._remove(key)
+            self.misses += 1
+            return None
+
+        if key in self._sizes:
+            self._sizes.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    async def put(self, key: str, pdf_bytes: bytes):
+        if len(pdf_bytes) > self.max_bytes:
+            return
+        await self._call(self.backend.put, key, time.time(), pdf_bytes)
+        # The index is only touched between awaits, so concurrent calls cannot corrupt it.
+        self._total_bytes -= self._sizes.pop(key, 0)
+        self._sizes[key] = len(pdf_bytes)
+        self._total_bytes += len(pdf_bytes)
+        evicted = []
+        while self._total_bytes > self.max_bytes:
+            evicted_key = next(iter(self._sizes))
+            self._total_bytes -= self._sizes.pop(evicted_key)
+            evicted.append(evicted_key)
+            self.evictions += 1
+        for evicted_key in evicted:
+            await self._call(self.backend.delete, evicted_key)
+
+    async def _remove(self, key: str):
+        self._total_bytes -= self._sizes.pop(key, 0)
+        await self._call(self.backend.delete, key)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._sizes),
+            'bytes': self._total_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+# template filename -> (version, variable names the template reads)
+_template_variables: dict = {}
+
+
+def _template_version(template_filename: str) -> str:
+    st = os.stat(os.path.join(templating.TEMPLATES_DIR, template_filename))
+    return f"{st.st_mtime_ns}:{st.st_size}"
+
+
+def _variables_for(template_filename: str, version: str) -> list[str]:
+    cached = _template_variables.get(template_filename)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    env = templating.get_environment()
+    source, _, _ = env.loader.get_source(env, template_filename)
+    variables = sorted(meta.find_undeclared_variables(env.parse(source)))
+    _template_variables[template_filename] = (version, variables)
+    return variables
+
+
+def make_key(template_filename: str, context: dict) -> str:
+    """
+    Hashes a template and the context values it reads into a cache key.
+
+    A local photo is identified by its path, size and mtime so replacing it
+    invalidates the cached PDF.
+    """
+    version = _template_version(template_filename)
+    normalized = {name: context.get(name) for name in _variables_for(template_filename, version)}
+
+    photo_uri = normalized.get('photo_path')
+    if photo_uri:
+        local_photo_path = photo_uri.replace('file://', '')
+        if os.path.exists(local_photo_path):
+            st = os.stat(local_photo_path)
+            normalized['photo_path'] = f"{photo_uri}:{st.st_size}:{st.st_mtime_ns}"
+
+    payload = json.dumps([template_filename, version, normalized], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+_cache: PdfCache | None = None
+
+
+def get_cache() -> PdfCache | None:
+    """
+    Returns the process-wide PDF cache, or None when caching is disabled.
+
+    In multi-process mode each worker caches the PDFs of the chats routed to it, in
+    its own directory and with an equal share of PDF_CACHE_MAX_MB, since the LRU
+    index that enforces the limit is per process.
+    """
+    global _cache
+    if _cache is None and config.PDF_CACHE_BACKEND != 'none':
+        directory, max_mb = config.PDF_CACHE_DIR, config.PDF_CACHE_MAX_MB
+        if config.WORKER_INDEX is not None:
+            directory = os.path.join(directory, f"worker_{config.WORKER_INDEX}")
+            max_mb /= config.WEB_WORKERS
+        if config.PDF_CACHE_BACKEND == 'disk':
+            backend = DiskBackend(directory)
+        else:
+            backend = MemoryBackend()
+        _cache = PdfCache(backend, int(max_mb * 1024 * 1024), config.PDF_CACHE_TTL)
+        logger.info(f"PDF cache enabled ({config.PDF_CACHE_BACKEND}, {max_mb:g} MB).")
+    return _cache
+
+
+def stats() -> dict:
+    cache = get_cache()
+    return cache.stats() if cache else {'enabled': False}
@@ -0,0 +1,53 @@
+"""Starts the 'About Me' Gemini call as soon as a resume is parsed, while the user picks a template."""
+import asyncio
+import logging
+
+import gemini_client
+from gemini_scheduler import PRIORITY_BACKGROUND, Priority
+
+logger = logging.getLogger(__name__)
+
+# user id -> (about me cache key the task was started for, task, the task's priority)
+_tasks: dict[int, tuple[str, asyncio.Task, Priority]] = {}
+
+
+def start_about_me(user_id: int, user_data: dict):
+    """Starts generating a user's 'About Me' text, replacing a prefetch for older data."""
+    cache_key = gemini_client.about_me_cache_key(user_data)
+    current = _tasks.get(user_id)
+    if current and current[0] == cache_key:
+        return
+
+    cancel(user_id)
+    # Work on a snapshot so later edits cannot change the prompt mid-flight.
+    priority = Priority(PRIORITY_BACKGROUND)
+    task = asyncio.create_task(gemini_client.generate_about_me(dict(user_data), priority=priority))
+    _tasks[user_id] = (cache_key, task, priority)
+
+
+async def get_about_me(user_id: int, user_data: dict) -> str | None:
+    """
+    Waits for a user's prefetched 'About Me' text. The user is now waiting on it, so
+    a request still queued in the background lane moves to the interactive lane.
+
+    Returns:
+        The text, or None if no prefetch matches the user's current data or it failed.
+    """
+    current = _tasks.pop(user_id, None)
+    if current is None:
+        return None
+
+    cache_key, task, priority = current
+    if cache_key != gemini_client.about_me_cache_key(user_data):
+        task.cancel()
+        return None
+
+    gemini_client.scheduler.escalate(priority)
+    return await task
+
+
+def cancel(user_id: int):
+    """Cancels a user's 'About Me' prefetch, if any."""
+    current = _tasks.pop(user_id, None)
+    if current and not current[1].done():
+        current[1].cancel()
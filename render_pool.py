@@ -0,0 +1,208 @@
+import os
+import signal
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import config
+import asset_cache
+import templating
+import stylesheets
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+# Extra time the event loop waits beyond the worker's own alarm before giving up on a job.
+_TIMEOUT_GRACE = 5
+
+
+class RenderQueueFull(Exception):
+    """Raised when every worker is busy and the waiting queue is full."""
+
+
+class RenderTimeout(Exception):
+    """Raised when a render job runs longer than the configured timeout."""
+
+
+def _current_rss_mb() -> float:
+    """Returns the resident set size of the current process in megabytes."""
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        # Not on Linux: fall back to the peak RSS, which is reported in kilobytes.
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _raise_timeout(signum, frame):
+    raise RenderTimeout("Render job exceeded its time limit.")
+
+
+def _init_worker():
+    """Warms a freshly started worker: compiled templates and default stylesheets."""
+    templating.precompile()
+    stylesheets.warm(os.path.basename(path) for path in config.TEMPLATES.values())
+
+
+def _render_in_worker(template_filename: str, context: dict, timeout: float) -> tuple[bytes, float]:
+    """
+    Renders a template to PDF bytes. Runs inside a worker process.
+
+    Returns:
+        A tuple of the PDF bytes and the worker's RSS in megabytes after the render.
+    """
+    # Imported here so the event loop process never pays for WeasyPrint's import.
+    from weasyprint import HTML
+
+    signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        html_out = templating.get_environment().get_template(template_filename).render(context)
+        # The template's CSS is parsed once and cached; only the user-specific markup is parsed here.
+        # The base_url should be the templates directory to resolve any relative asset paths
+        pdf_bytes = HTML(
+            string=stylesheets.strip_stylesheets(html_out), base_url=TEMPLATES_DIR,
+            url_fetcher=asset_cache.url_fetcher,
+        ).write_pdf(
+            stylesheets=stylesheets.get_stylesheets(template_filename, context),
+            font_config=stylesheets.get_font_config(),
+        )
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+
+    return pdf_bytes, _current_rss_mb()
+
+
+class RenderPool:
+    """
+    A bounded pool of worker processes that turn (template, context) pairs into PDF bytes.
+
+    Workers are recycled after a fixed number of renders, and the whole pool is
+    rotated as soon as any worker reports an RSS above the configured watermark.
+    """
+
+    def __init__(self, workers: int, queue_size: int, job_timeout: float,
+                 max_jobs_per_worker: int, max_rss_mb: int):
+        self.workers = max(1, workers)
+        self.job_timeout = job_timeout
+        self.max_jobs_per_worker = max_jobs_per_worker
+        self.max_rss_mb = max_rss_mb
+        self._slots = asyncio.Semaphore(self.workers + max(0, queue_size))
+        self._active = 0  # Jobs holding a slot, queued or running
+        self._executor = self._new_executor()
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # 'spawn' keeps workers free of the event loop's threads and sockets,
+        # and is required for max_tasks_per_child.
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            max_tasks_per_child=self.max_jobs_per_worker or None,
+            initializer=_init_worker,
+        )
+
+    def _recycle(self, reason: str):
+        """Replaces the executor. Jobs already running on the old one are allowed to finish."""
+        logger.info(f"Recycling render workers: {reason}")
+        old_executor, self._executor = self._executor, self._new_executor()
+        old_executor.shutdown(wait=False)
+
+    @staticmethod
+    def _kill(executor: ProcessPoolExecutor):
+        """
+        Shuts an executor down and kills its worker processes, so a worker stuck in
+        native code does not linger. Other jobs still running on it fail.
+        """
+        # Copied first: the executor forgets its processes as they exit.
+        processes = list((executor._processes or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            if process.is_alive():
+                process.kill()
+
+    async def render(self, template_filename: str, context: dict, low_priority: bool = False) -> bytes:
+        """
+        Renders a template to PDF bytes in a worker process.
+
+        Low-priority jobs (speculative pre-renders) are only admitted while a worker
+        is idle, so they never wait in, or lengthen, the queue of interactive jobs.
+
+        Raises:
+            RenderQueueFull: If the pool and its waiting queue are saturated, or no
+                worker is idle for a low-priority job.
+            RenderTimeout: If the job does not finish within the configured timeout.
+        """
+        if self._slots.locked() or (low_priority and self._active >= self.workers):
+            raise RenderQueueFull("All render workers are busy and the queue is full.")
+
+        async with self._slots:
+            self._active += 1
+            try:
+                return await self._run(template_filename, context)
+            finally:
+                self._active -= 1
+
+    async def _run(self, template_filename: str, context: dict) -> bytes:
+        """Submits one job to the current executor and waits for its result."""
+        executor = self._executor
+        future = executor.submit(_render_in_worker, template_filename, context, self.job_timeout)
+        try:
+            pdf_bytes, rss_mb = await asyncio.wait_for(
+                asyncio.wrap_future(future), self.job_timeout + _TIMEOUT_GRACE
+            )
+        except asyncio.TimeoutError:
+            # The worker ignored its alarm (e.g. stuck in native code); start fresh
+            # workers and kill the old ones, whichever executor the job ran on.
+            if executor is self._executor:
+                self._recycle("job timed out")
+            self._kill(executor)
+            raise RenderTimeout(f"Rendering '{template_filename}' timed out.")
+
+        if self.max_rss_mb and rss_mb > self.max_rss_mb and executor is self._executor:
+            self._recycle(f"worker RSS {rss_mb:.0f} MB exceeds {self.max_rss_mb} MB")
+
+        return pdf_bytes
+
+    async def shutdown(self):
+        """Cancels queued jobs and waits for running ones to finish."""
+        await asyncio.to_thread(self._executor.shutdown, wait=True, cancel_futures=True)
+
+
+_pool: RenderPool | None = None
+
+
+def start_pool() -> RenderPool:
+    """Creates the process-wide render pool from the settings in config."""
+    global _pool
+    if _pool is None:
+        workers = config.RENDER_WORKERS
+        if config.WORKER_INDEX is not None:
+            # In multi-process mode every bot process gets an equal share of the render workers.
+            workers = max(1, workers // config.WEB_WORKERS)
+        _pool = RenderPool(
+            workers=workers,
+            queue_size=config.RENDER_QUEUE_SIZE,
+            job_timeout=config.RENDER_JOB_TIMEOUT,
+            max_jobs_per_worker=config.RENDER_MAX_JOBS_PER_WORKER,
+            max_rss_mb=config.RENDER_MAX_RSS_MB,
+        )
+        logger.info(f"Render pool started with {_pool.workers} worker(s).")
+    return _pool
+
+
+def get_pool() -> RenderPool:
+    """Returns the process-wide render pool, starting it on first use."""
+    return _pool or start_pool()
+
+
+async def shutdown_pool():
+    """Shuts down the process-wide render pool, if it was started."""
+    global _pool
+    if _pool is not None:
+        await _pool.shutdown()
+        _pool = None
+        logger.info("Render pool has been shut down.")
@@ -0,0 +1,181 @@
+"""
+The shape of parsed resume data, and local validation/repair of model output.
+
+parse_resume_from_template asks Gemini for JSON matching response_schema(). Whatever
+comes back (or whatever a local parser produced) goes through normalize_resume,
+which fixes the small deviations models make, such as ratings given as "4/5",
+a single experience string instead of a list, or a trailing comma, instead of
+failing the whole parse and making the user resend their resume.
+"""
+import re
+import json
+
+# Scalar fields, in the order the template asks for them.
+SCALAR_FIELDS = ['name', 'birthday', 'email', 'phone', 'website', 'address', 'language', 'nic_number']
+LIST_FIELDS = ['experience', 'education']
+
+MIN_RATING = 1
+MAX_RATING = 5
+DEFAULT_RATING = 3
+
+
+def response_schema(include_about_me: bool = False) -> dict:
+    """Returns the Gemini response schema for a parsed resume."""
+    properties = {field: {'type': 'STRING', 'nullable': True} for field in SCALAR_FIELDS}
+    properties['skills'] = {
+        'type': 'ARRAY',
+        'items': {
+            'type': 'OBJECT',
+            'properties': {'name': {'type': 'STRING'}, 'rating': {'type': 'INTEGER'}},
+            'required': ['name', 'rating'],
+        },
+    }
+    for field in LIST_FIELDS:
+        properties[field] = {'type': 'ARRAY', 'items': {'type': 'STRING'}}
+    required = SCALAR_FIELDS + ['skills'] + LIST_FIELDS
+    if include_about_me:
+        properties['about_me'] = {'type': 'STRING'}
+        required = required + ['about_me']
+    return {'type': 'OBJECT', 'properties': properties, 'required': required}
+
+
+def load_json(text: str):
+    """
+    Decodes model output as JSON, repairing common damage: code fences, prose
+    around the object and trailing commas.
+
+    Raises:
+        json.JSONDecodeError: If the text cannot be repaired.
+    """
+    text = text.strip().replace("```json", "").replace("```", "").strip()
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+
+    start, end = text.find('{'), text.rfind('}')
+    if start != -1 and end > start:
+        text = text[start:end + 1]
+    text = re.sub(r',\s*([}\]])', r'\1', text)
+    return json.loads(text)
+
+
+def _clean_scalar(value) -> str | None:
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        value = ', '.join(str(v) for v in value if v is not None)
+    value = str(value).strip()
+    if not value or value.lower() in ('null', 'none', 'n/a'):
+        return None
+    return value
+
+
+def parse_rating(value) -> int:
+    """Turns a rating like 4, "4", "4/5" or "4.5" into an int clamped to 1-5."""
+    if isinstance(value, bool):
+        return DEFAULT_RATING
+    if isinstance(value, (int, float)):
+        rating = round(value)
+    else:
+        match = re.search(r'\d+(?:\.\d+)?', str(value or ''))
+        if not match:
+            return DEFAULT_RATING
+        rating = round(float(match.group()))
+    return max(MIN_RATING, min(MAX_RATING, rating))
+
+
+def _clean_skill(skill) -> dict | None:
+    if isinstance(skill, dict):
+        name, rating = skill.get('name'), skill.get('rating')
+    elif isinstance(skill, str):
+        name, _, rating = skill.rpartition(',') if ',' in skill else (skill, '', None)
+    else:
+        return None
+    name = _clean_scalar(name)
+    if not name:
+        return None
+    return {'name': name, 'rating': parse_rating(rating)}
+
+
+def _clean_list(value) -> list[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split('\n')
+    items = []
+    for item in value:
+        if isinstance(item, dict):
+            item = ', '.join(str(v) for v in item.values() if v)
+        item = _clean_scalar(item)
+        if item:
+            items.append(item)
+    return items
+
+
+def normalize_resume(data) -> dict | None:
+    """
+    Coerces parsed resume data into the exact shape the rest of the bot expects.
+
+    Returns:
+        The normalized dict, or None if the data is not a resume at all.
+    """
+    if not isinstance(data, dict):
+        return None
+
+    resume = {field: _clean_scalar(data.get(field)) for field in SCALAR_FIELDS}
+    skills = data.get('skills') or []
+    if isinstance(skills, (str, dict)):
+        skills = skills.split('\n') if isinstance(skills, str) else [skills]
+    resume['skills'] = [s for s in (_clean_skill(skill) for skill in skills) if s]
+    for field in LIST_FIELDS:
+        resume[field] = _clean_list(data.get(field))
+
+    if not any(resume.values()):
+        return None
+    return resume
+
+
+# Sections the review menu lets users edit, and the fields each one owns.
+SECTION_FIELDS = {
+    'personal': SCALAR_FIELDS,
+    'experience': ['experience'],
+    'education': ['education'],
+    'skills': ['skills'],
+}
+
+
+def section_schema(section: str) -> dict:
+    """Returns the Gemini response schema for a single editable section."""
+    full = response_schema()
+    fields = SECTION_FIELDS[section]
+    properties = {field: full['properties'][field] for field in fields}
+    if section == 'personal':
+        # Only the fields the user sent are returned; the rest keep their values.
+        return {'type': 'OBJECT', 'properties': properties}
+    return {'type': 'OBJECT', 'properties': properties, 'required': fields}
+
+
+def normalize_section(section: str, data) -> dict | None:
+    """
+    Coerces the parsed contents of one section into resume fields.
+
+    Returns:
+        Only that section's fields (for personal details, only those present), or
+        None if nothing usable was found.
+    """
+    if not isinstance(data, dict):
+        return None
+    if section == 'personal':
+        # Fields without a value are left out so they don't overwrite stored ones.
+        updates = {field: _clean_scalar(data[field]) for field in SCALAR_FIELDS if field in data}
+        updates = {field: value for field, value in updates.items() if value is not None}
+        return updates or None
+    if section == 'skills':
+        skills = data.get('skills') or []
+        if isinstance(skills, (str, dict)):
+            skills = skills.split('\n') if isinstance(skills, str) else [skills]
+        skills = [s for s in (_clean_skill(skill) for skill in skills) if s]
+        return {'skills': skills} if skills else None
+    entries = _clean_list(data.get(section))
+    return {section: entries} if entries else None
@@ -0,0 +1,103 @@
+"""
+Session expiry for verified users.
+
+Instead of one JobQueue job per session, every session deadline lives in a hashed
+timer wheel: deadlines are bucketed into slots of `resolution` seconds, so starting,
+touching (sliding the deadline on activity) and cancelling a session are O(1) set
+and dict operations, and a single periodic sweeper job only visits the buckets
+that came due since its last run.
+"""
+import time
+import logging
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class SessionExpiry:
+    """A hashed timer wheel of session deadlines, keyed by user id."""
+
+    def __init__(self, timeout: float, resolution: float, sliding: bool = True):
+        self.timeout = timeout
+        self.resolution = resolution
+        self.sliding = sliding
+        self.expired = 0
+        self._sessions: dict[int, tuple[int, float]] = {} # user id -> (chat id, deadline)
+        self._buckets: dict[int, set[int]] = {} # slot -> user ids whose deadline falls in it
+        self._next_slot = self._slot(time.time())
+
+    def _slot(self, deadline: float) -> int:
+        return int(deadline // self.resolution)
+
+    def _schedule(self, user_id: int, chat_id: int, deadline: float):
+        self._unschedule(user_id)
+        self._sessions[user_id] = (chat_id, deadline)
+        # A deadline in a slot the sweeper already passed goes in the next one it visits.
+        slot = max(self._slot(deadline), self._next_slot)
+        self._buckets.setdefault(slot, set()).add(user_id)
+
+    def _unschedule(self, user_id: int) -> bool:
+        session = self._sessions.pop(user_id, None)
+        if session is None:
+            return False
+        slot = max(self._slot(session[1]), self._next_slot)
+        bucket = self._buckets.get(slot)
+        if bucket is not None:
+            bucket.discard(user_id)
+            if not bucket:
+                del self._buckets[slot]
+        return True
+
+    def start(self, user_id: int, chat_id: int, now: float = None):
+        """Starts (or restarts) a user's session, expiring `timeout` seconds from now."""
+        now = time.time() if now is None else now
+        self._schedule(user_id, chat_id, now + self.timeout)
+
+    def touch(self, user_id: int, now: float = None):
+        """Records activity: pushes the deadline of a sliding session back to `timeout` from now."""
+        if not self.sliding:
+            return
+        session = self._sessions.get(user_id)
+        if session is not None:
+            now = time.time() if now is None else now
+            self._schedule(user_id, session[0], now + self.timeout)
+
+    def cancel(self, user_id: int) -> bool:
+        """Ends a session without expiring it. Returns whether there was one."""
+        return self._unschedule(user_id)
+
+    def sweep(self, now: float = None) -> list[tuple[int, int]]:
+        """
+        Removes the sessions whose deadline has passed.
+
+        Returns:
+            (user id, chat id) for every expired session.
+        """
+        now = time.time() if now is None else now
+        current_slot = self._slot(now)
+        expired = []
+        # Slots are visited one by one, but empty ones cost a dict lookup: the sweeper
+        # runs about once per slot, so this loop is usually one or two iterations.
+        for slot in range(self._next_slot, current_slot + 1):
+            for user_id in self._buckets.pop(slot, ()):
+                chat_id, deadline = self._sessions[user_id]
+                if deadline <= now:
+                    del self._sessions[user_id]
+                    expired.append((user_id, chat_id))
+                else:
+                    # Due later within the current slot: keep it for the next sweep.
+                    self._buckets.setdefault(current_slot + 1, set()).add(user_id)
+        self._next_slot = current_slot + 1
+        self.expired += len(expired)
+        return expired
+
+    def stats(self) -> dict:
+        return {
+            'active_sessions': len(self._sessions),
+            'buckets': len(self._buckets),
+            'expired': self.expired,
+        }
+
+
+sessions = SessionExpiry(config.SESSION_TIMEOUT, config.SESSION_SWEEP_INTERVAL, sliding=config.SESSION_SLIDING)
@@ -0,0 +1,252 @@
+"""
+SQLite persistence for conversation state and user_data.
+
+Sessions survive restarts, but only in the shape the bot actually uses: each user
+is one typed row (resume fields, template choices, attempts left, ...). Keys
+outside that schema are not persisted, and text and lists are capped, so a record
+stays small however much the model returned. Records are loaded lazily, the
+first time a user sends an update after a restart, and writes are buffered and
+committed in one transaction per persistence cycle instead of once per update.
+"""
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+from enum import Enum
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+import resume_schema
+
+logger = logging.getLogger(__name__)
+
+# user_data key -> column type. Keys outside this schema are not persisted.
+SCALAR_COLUMNS = {
+    'user_id': 'INTEGER',
+    'chat_id': 'INTEGER',
+    'verified': 'INTEGER',
+    'generation_attempts': 'INTEGER',
+    'selected_template': 'TEXT',
+    'last_template': 'TEXT',
+    'photo_path': 'TEXT',
+    'about_me': 'TEXT',
+    **{field: 'TEXT' for field in resume_schema.SCALAR_FIELDS},
+}
+BOOL_COLUMNS = {'verified'}
+LIST_COLUMNS = ['skills'] + resume_schema.LIST_FIELDS # Stored as compact JSON
+COLUMNS = list(SCALAR_COLUMNS) + LIST_COLUMNS
+
+MAX_TEXT_LENGTH = 2000
+MAX_LIST_ITEMS = 30
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS sessions (
+    user_id INTEGER PRIMARY KEY,
+    {', '.join(f'{column} {column_type}' for column, column_type in SCALAR_COLUMNS.items() if column != 'user_id')},
+    {', '.join(f'{column} TEXT' for column in LIST_COLUMNS)},
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS conversations (
+    name TEXT NOT NULL,
+    chat_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    PRIMARY KEY (name, chat_id, user_id)
+);
+"""
+
+
+def _clip(value):
+    if isinstance(value, str):
+        return value[:MAX_TEXT_LENGTH]
+    return value
+
+
+def encode(user_data: dict) -> tuple:
+    """Packs user_data into a sessions row (without user_id and updated_at), capping text and lists."""
+    row = []
+    for column in SCALAR_COLUMNS:
+        if column == 'user_id':
+            continue
+        value = user_data.get(column)
+        row.append(int(value) if column in BOOL_COLUMNS and value is not None else _clip(value))
+    for column in LIST_COLUMNS:
+        items = (user_data.get(column) or [])[:MAX_LIST_ITEMS]
+        if column == 'skills':
+            items = [[_clip(skill.get('name')), skill.get('rating')] for skill in items]
+        else:
+            items = [_clip(item) for item in items]
+        row.append(json.dumps(items, separators=(',', ':')) if items else None)
+    return tuple(row)
+
+
+def decode(row: tuple) -> dict:
+    """Unpacks a sessions row (in COLUMNS order) into user_data."""
+    user_data = {}
+    for column, value in zip(COLUMNS, row):
+        if column in LIST_COLUMNS:
+            items = json.loads(value) if value else []
+            if column == 'skills':
+                items = [{'name': name, 'rating': rating} for name, rating in items]
+            user_data[column] = items
+        elif value is not None:
+            user_data[column] = bool(value) if column in BOOL_COLUMNS else value
+    user_data.setdefault('photo_path', None)
+    return user_data
+
+
+class SqlitePersistence(BasePersistence):
+    """Persists user_data and conversation states in SQLite; chat, bot and callback data are not stored."""
+
+    def __init__(self, path: str, state_type: type[Enum], update_interval: float = 60):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self.state_type = state_type
+        self.commits = 0
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._add_missing_columns()
+        # Writes waiting for the next commit: user id -> encoded row, or None to delete it
+        self._pending_users: dict[int, tuple | None] = {}
+        # (name, chat id, user id) -> state name, or None to delete it
+        self._pending_conversations: dict[tuple, str | None] = {}
+        self._commit_scheduled = False
+        # Users whose record was already loaded into (or never existed for) their user_data.
+        # A cleared user_data must not be reloaded from a row that is about to be deleted.
+        self._loaded: set[int] = set()
+
+    def _add_missing_columns(self):
+        """Adds columns introduced since the sessions table was created; they start out NULL."""
+        existing = {row[1] for row in self._conn.execute("PRAGMA table_info(sessions)")}
+        with self._conn:
+            for column in COLUMNS:
+                if column not in existing:
+                    column_type = SCALAR_COLUMNS.get(column, 'TEXT')
+                    self._conn.execute(f"ALTER TABLE sessions ADD COLUMN {column} {column_type}")
+
+    def _schedule_commit(self):
+        # The Application pushes every changed user in one burst each update_interval
+        # seconds; committing once that burst has run makes it a single transaction.
+        if not self._commit_scheduled:
+            self._commit_scheduled = True
+            asyncio.get_running_loop().call_soon(self._commit)
+
+    def _commit(self):
+        self._commit_scheduled = False
+        if not self._pending_users and not self._pending_conversations:
+            return
+        users, self._pending_users = self._pending_users, {}
+        conversations, self._pending_conversations = self._pending_conversations, {}
+        now = time.time()
+        placeholders = ', '.join('?' * (len(COLUMNS) + 1))
+        with self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO sessions ({', '.join(COLUMNS)}, updated_at) VALUES ({placeholders})",
+                [(user_id, *row, now) for user_id, row in users.items() if row is not None],
+            )
+            self._conn.executemany(
+                "DELETE FROM sessions WHERE user_id = ?",
+                [(user_id,) for user_id, row in users.items() if row is None],
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO conversations (name, chat_id, user_id, state) VALUES (?, ?, ?, ?)",
+                [(*key, state) for key, state in conversations.items() if state is not None],
+            )
+            self._conn.executemany(
+                "DELETE FROM conversations WHERE name = ? AND chat_id = ? AND user_id = ?",
+                [key for key, state in conversations.items() if state is None],
+            )
+        self.commits += 1
+
+    def active_sessions(self) -> list[tuple[int, int, float]]:
+        """
+        Returns (user id, chat id, last write time) for every verified session on disk.
+        Rows written before the chat id was stored report the user's private chat.
+        """
+        return self._conn.execute(
+            "SELECT user_id, COALESCE(chat_id, user_id), updated_at FROM sessions WHERE verified = 1"
+        ).fetchall()
+
+    # --- user_data ---
+
+    async def get_user_data(self) -> dict:
+        # Nothing is loaded up front; refresh_user_data loads a user on their first update.
+        return {}
+
+    async def refresh_user_data(self, user_id: int, user_data: dict):
+        if user_id in self._loaded:
+            return
+        self._loaded.add(user_id)
+        if user_id in self._pending_users:
+            row = self._pending_users[user_id]
+            if row is not None:
+                user_data.update(decode((user_id, *row)))
+            return
+        row = self._conn.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM sessions WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is not None:
+            user_data.update(decode(row))
+
+    async def update_user_data(self, user_id: int, data: dict):
+        self._pending_users[user_id] = encode(data) if data else None
+        self._schedule_commit()
+
+    async def drop_user_data(self, user_id: int):
+        self._pending_users[user_id] = None
+        # Nothing is left to load: the deletion is pending or committed.
+        self._loaded.discard(user_id)
+        self._schedule_commit()
+
+    # --- conversations ---
+
+    async def get_conversations(self, name: str) -> dict:
+        return {
+            (chat_id, user_id): self.state_type[state]
+            for chat_id, user_id, state in self._conn.execute(
+                "SELECT chat_id, user_id, state FROM conversations WHERE name = ?", (name,)
+            )
+        }
+
+    async def update_conversation(self, name: str, key: tuple, new_state):
+        chat_id, user_id = key
+        self._pending_conversations[(name, chat_id, user_id)] = new_state.name if new_state is not None else None
+        self._schedule_commit()
+
+    # --- not stored ---
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def update_chat_data(self, chat_id: int, data: dict):
+        pass
+
+    async def update_bot_data(self, data: dict):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id: int):
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict):
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict):
+        pass
+
+    async def flush(self):
+        self._commit()
+        self._conn.close()
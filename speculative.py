@@ -0,0 +1,64 @@
+"""Renders the likely next "Regenerate with New Design" PDF in the background on an idle worker."""
+import asyncio
+import logging
+
+import generator
+
+logger = logging.getLogger(__name__)
+
+# user id -> (template name, task resolving to a PDF file object or None).
+# Kept out of user_data, which is copied to the render workers.
+_pending: dict[int, tuple[str, asyncio.Task]] = {}
+
+
+def start(user_id: int, user_data: dict, exclude_template: str = None) -> bool:
+    """
+    Starts rendering the PDF a regeneration would produce, replacing any earlier one.
+
+    Returns:
+        Whether a render was scheduled.
+    """
+    cancel(user_id)
+
+    template_name = generator.select_template(user_data.get('selected_template'), exclude_template)
+    if template_name == exclude_template:
+        # Only one template exists: regenerating renders it again, which the PDF cache already covers.
+        return False
+
+    task = asyncio.create_task(generator.prerender_pdf(dict(user_data), template_name, stream=True))
+    _pending[user_id] = (template_name, task)
+    logger.info(f"Pre-rendering template '{template_name}' for user {user_id}.")
+    return True
+
+
+async def take(user_id: int) -> tuple[str, str] | None:
+    """
+    Hands over the speculative PDF for a user, waiting for it if it is still rendering.
+
+    Returns:
+        A tuple of the PDF file object and template name, or None if nothing usable was
+        pre-rendered. The caller must close the file object.
+    """
+    pending = _pending.pop(user_id, None)
+    if pending is None:
+        return None
+
+    template_name, task = pending
+    pdf_stream = await task
+    if not pdf_stream:
+        return None
+    logger.info(f"Using pre-rendered template '{template_name}' for user {user_id}.")
+    return pdf_stream, template_name
+
+
+def cancel(user_id: int):
+    """Cancels a user's speculative render and releases its PDF if it already finished."""
+    pending = _pending.pop(user_id, None)
+    if pending is None:
+        return
+
+    _, task = pending
+    if not task.done():
+        task.cancel()
+    elif not task.cancelled() and task.exception() is None and task.result():
+        task.result().close()
@@ -0,0 +1,110 @@
+"""
+Per-template cache of parsed WeasyPrint stylesheets.
+
+Each template carries the same `<style>` block and stylesheet `<link>`s on every
+render; only the body changes per user. Here the CSS is split out of the template
+once, parsed into `weasyprint.CSS` objects and kept keyed by the template and the
+values of the few context variables the CSS actually uses (e.g. accent_color).
+The HTML handed to WeasyPrint per request has those tags stripped, so only the
+user-specific markup is parsed each time.
+"""
+import re
+import logging
+
+from jinja2 import meta
+
+import asset_cache
+import templating
+
+logger = logging.getLogger(__name__)
+
+# <style> blocks and stylesheet <link>s, matched in document order so the cascade is preserved.
+_STYLE_TAG_RE = re.compile(
+    r'<style[^>]*>(?P<css>.*?)</style>'
+    r'|<link\b(?=[^>]*\brel\s*=\s*["\']stylesheet["\'])[^>]*\bhref\s*=\s*["\'](?P<href>[^"\']+)["\'][^>]*>',
+    re.S | re.I,
+)
+
+_font_config = None
+# template filename -> (uptodate check, [(kind, compiled style template | href)], css variable names)
+_sources: dict = {}
+# (template filename, css variable values) -> [CSS]
+_stylesheets: dict = {}
+
+
+def get_font_config():
+    """Returns the FontConfiguration shared by every stylesheet and render in this process."""
+    global _font_config
+    if _font_config is None:
+        from weasyprint.text.fonts import FontConfiguration
+        _font_config = FontConfiguration()
+    return _font_config
+
+
+def _load_source(template_filename: str) -> tuple[list, tuple]:
+    """Splits a template's CSS out of its source, reloading it if the file changed."""
+    cached = _sources.get(template_filename)
+    if cached and (cached[0] is None or cached[0]()):
+        return cached[1], cached[2]
+
+    env = templating.get_environment()
+    source, _, uptodate = env.loader.get_source(env, template_filename)
+
+    parts = []
+    variables = set()
+    for match in _STYLE_TAG_RE.finditer(source):
+        if match.group('href'):
+            parts.append(('href', match.group('href')))
+        else:
+            css_source = match.group('css')
+            variables |= meta.find_undeclared_variables(env.parse(css_source))
+            parts.append(('css', env.from_string(css_source)))
+
+    variables = tuple(sorted(variables))
+    # Drop parsed stylesheets built from an older version of this template.
+    for key in [k for k in _stylesheets if k[0] == template_filename]:
+        del _stylesheets[key]
+    _sources[template_filename] = (uptodate if env.auto_reload else None, parts, variables)
+    return parts, variables
+
+
+def get_stylesheets(template_filename: str, context: dict) -> list:
+    """Returns the parsed stylesheets for a template rendered with the given context."""
+    from weasyprint import CSS
+
+    parts, variables = _load_source(template_filename)
+    # Only pass variables the context actually has, so `default()` filters still apply.
+    css_context = {name: context[name] for name in variables if name in context}
+    key = (template_filename, tuple(css_context.items()))
+
+    stylesheets = _stylesheets.get(key)
+    if stylesheets is None:
+        font_config = get_font_config()
+        stylesheets = []
+        for kind, value in parts:
+            if kind == 'href':
+                stylesheets.append(CSS(
+                    url=value, url_fetcher=asset_cache.url_fetcher, font_config=font_config
+                ))
+            else:
+                stylesheets.append(CSS(
+                    string=value.render(css_context), base_url=templating.TEMPLATES_DIR,
+                    url_fetcher=asset_cache.url_fetcher, font_config=font_config,
+                ))
+        _stylesheets[key] = stylesheets
+        logger.info(f"Parsed {len(stylesheets)} stylesheet(s) for '{template_filename}'.")
+    return stylesheets
+
+
+def strip_stylesheets(html: str) -> str:
+    """Removes <style> blocks and stylesheet <link>s from rendered HTML."""
+    return _STYLE_TAG_RE.sub('', html)
+
+
+def warm(template_filenames):
+    """Parses the default-styled stylesheets for the given templates."""
+    for template_filename in template_filenames:
+        try:
+            get_stylesheets(template_filename, {})
+        except Exception as e:
+            logger.error(f"Failed to parse stylesheets for '{template_filename}': {e}")
@@ -0,0 +1,211 @@
+"""
+Expiry index for the bot's temporary files.
+
+Files (rendered PDFs, user photos) are registered when they are created, with the
+time they expire. Expiries are kept in a min-heap, so the reaper wakes up exactly
+when the next file is due and only touches files that are due, instead of walking
+every directory on a timer. The index is persisted in SQLite so it survives
+restarts; a full scan of the temp directories runs only once, at startup, to pick
+up files the index does not know about and forget files that are already gone.
+The scan only adopts files named like the ones the bot creates, so caches that
+live under the same root are never touched.
+"""
+import os
+import time
+import heapq
+import sqlite3
+import asyncio
+import logging
+
+import config
+
+logger = logging.getLogger(__name__)
+
+_RETRY_DELAY = 60 # Seconds before reaping again after a failed pass
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS temp_files (
+    path TEXT PRIMARY KEY,
+    expires_at REAL NOT NULL
+);
+"""
+
+
+class TempFileReaper:
+    """Deletes registered files when they expire, earliest first."""
+
+    def __init__(self, db_path: str, max_age: float, root: str, exclude: tuple[str, ...] = (),
+                 adopt: tuple[str, ...] = ()):
+        self.max_age = max_age
+        self.root = root
+        self.exclude = tuple(os.path.abspath(path) for path in exclude)
+        self.adopt = tuple(os.path.abspath(prefix) for prefix in adopt) # Path prefixes the startup scan may adopt
+        self.files_reclaimed = 0
+        self.bytes_reclaimed = 0
+        self._expiry: dict[str, float] = {} # path -> expiry time; the source of truth
+        self._heap: list[tuple[float, str]] = [] # (expiry time, path), may hold superseded entries
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._conn = sqlite3.connect(db_path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def register(self, path: str, ttl: float = None):
+        """Schedules a file for deletion `ttl` seconds from now (default: the reaper's max age)."""
+        path = os.path.abspath(path)
+        expires_at = time.time() + (self.max_age if ttl is None else ttl)
+        wakes_earlier = not self._heap or expires_at < self._heap[0][0]
+        self._expiry[path] = expires_at
+        heapq.heappush(self._heap, (expires_at, path))
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO temp_files (path, expires_at) VALUES (?, ?)", (path, expires_at)
+            )
+        if wakes_earlier:
+            self._wakeup.set()
+
+    def unregister(self, path: str):
+        """Forgets a file its owner already deleted."""
+        path = os.path.abspath(path)
+        if self._expiry.pop(path, None) is not None:
+            with self._conn:
+                self._conn.execute("DELETE FROM temp_files WHERE path = ?", (path,))
+
+    def reconcile(self, scan: bool = True):
+        """
+        Loads the persisted index and brings it in line with the disk: files that no
+        longer exist are dropped and, if `scan` is set, untracked files found under the
+        root whose path starts with one of the `adopt` prefixes are adopted, expiring
+        max_age after their mtime.
+        """
+        indexed = dict(self._conn.execute("SELECT path, expires_at FROM temp_files"))
+        on_disk = {}
+        if scan:
+            for dirpath, dirnames, filenames in os.walk(self.root):
+                dirnames[:] = [d for d in dirnames if os.path.join(dirpath, d) not in self.exclude]
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    if path not in indexed and not path.startswith(self.adopt):
+                        continue
+                    try:
+                        on_disk[path] = indexed.get(path) or os.path.getmtime(path) + self.max_age
+                    except OSError:
+                        continue
+        else:
+            on_disk = {path: expires_at for path, expires_at in indexed.items() if os.path.exists(path)}
+
+        self._expiry = on_disk
+        self._heap = [(expires_at, path) for path, expires_at in on_disk.items()]
+        heapq.heapify(self._heap)
+        with self._conn:
+            self._conn.execute("DELETE FROM temp_files")
+            self._conn.executemany("INSERT INTO temp_files (path, expires_at) VALUES (?, ?)", on_disk.items())
+        untracked = len(on_disk.keys() - indexed.keys())
+        logger.info(f"Temp file reaper tracking {len(on_disk)} file(s), {untracked} of them found by the startup scan.")
+
+    def reap(self, now: float = None) -> int:
+        """Deletes every file that is due and returns how many were deleted."""
+        now = time.time() if now is None else now
+        reaped = []
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, path = heapq.heappop(self._heap)
+            if self._expiry.get(path) != expires_at:
+                continue # Unregistered or re-registered since this entry was pushed.
+            del self._expiry[path]
+            reaped.append(path)
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logger.error(f"Error removing temp file {path}: {e}")
+                continue
+            self.files_reclaimed += 1
+            self.bytes_reclaimed += size
+            logger.info(f"Cleaned up old temp file: {path}")
+
+        if reaped:
+            with self._conn:
+                self._conn.executemany("DELETE FROM temp_files WHERE path = ?", [(path,) for path in reaped])
+        return len(reaped)
+
+    async def _run(self):
+        while True:
+            try:
+                self.reap()
+                delay = self._heap[0][0] - time.time() if self._heap else None
+            except Exception as e:
+                # Keep the task alive; pause so a persistent error (e.g. a locked index) doesn't spin.
+                logger.error(f"Temp file reap failed, retrying in {_RETRY_DELAY}s: {e}")
+                delay = _RETRY_DELAY
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._conn.close()
+
+    def stats(self) -> dict:
+        return {
+            'tracked_files': len(self._expiry),
+            'next_expiry_in': round(max(0.0, self._heap[0][0] - time.time()), 1) if self._heap else None,
+            'files_reclaimed': self.files_reclaimed,
+            'bytes_reclaimed': self.bytes_reclaimed,
+        }
+
+
+_reaper: TempFileReaper | None = None
+
+
+def start(adopt: tuple[str, ...] = ()):
+    """
+    Reconciles the index with the disk and starts reaping. Call from the running event loop.
+
+    Args:
+        adopt: Path prefixes of the files the bot creates; untracked files found by the
+            startup scan are only adopted if they match one.
+
+    In multi-process mode each worker keeps its own index of the files it created,
+    and only worker 0 scans the disk for files no index knows about.
+    """
+    global _reaper
+    os.makedirs(config.TEMP_DIR, exist_ok=True)
+    db_path = config.TEMP_REAPER_DB_PATH
+    if config.WORKER_INDEX is not None:
+        base, extension = os.path.splitext(db_path)
+        db_path = f"{base}.{config.WORKER_INDEX}{extension}"
+    _reaper = TempFileReaper(
+        db_path, config.TEMP_FILE_MAX_AGE, config.TEMP_DIR,
+        exclude=(config.PDF_CACHE_DIR, config.TEMPLATE_BYTECODE_DIR), adopt=adopt,
+    )
+    _reaper.reconcile(scan=config.WORKER_INDEX in (None, 0))
+    _reaper.start()
+
+
+def register(path: str, ttl: float = None):
+    """Schedules a temporary file for deletion; a no-op before start() (e.g. in render workers)."""
+    if _reaper is not None:
+        _reaper.register(path, ttl)
+
+
+def unregister(path: str):
+    if _reaper is not None:
+        _reaper.unregister(path)
+
+
+async def shutdown():
+    if _reaper is not None:
+        await _reaper.stop()
+
+
+def stats() -> dict | None:
+    return _reaper.stats() if _reaper is not None else None
@@ -0,0 +1,158 @@
+"""
+The template preview gallery.
+
+Each preview image under image/ is uploaded to Telegram once; the file_id Telegram
+returns is persisted and every later gallery is sent by file_id, in media groups
+of up to ten photos, followed by a single message with a compact selection
+keyboard listing every template. A gallery therefore costs a few lightweight API
+calls instead of one upload per template. Templates without a preview image are
+still selectable, they just have no photo. Replacing an image on disk (new size or mtime) uploads it again.
+"""
+import os
+import json
+import math
+import asyncio
+import logging
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto
+from telegram.error import BadRequest
+
+import config
+
+logger = logging.getLogger(__name__)
+
+IMAGE_DIR = 'image'
+MEDIA_GROUP_SIZE = 10 # Telegram's limit on photos per media group
+BUTTONS_PER_ROW = 3
+
+# template name -> {'file_id': ..., 'size': ..., 'mtime': ...}
+_file_ids: dict[str, dict] | None = None
+_upload_lock = asyncio.Lock()
+
+
+def _load() -> dict[str, dict]:
+    global _file_ids
+    if _file_ids is None:
+        try:
+            with open(config.TEMPLATE_GALLERY_PATH, 'r') as f:
+                _file_ids = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            _file_ids = {}
+    return _file_ids
+
+
+def _save():
+    tmp_path = f"{config.TEMPLATE_GALLERY_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(_file_ids, f, indent=2)
+    os.replace(tmp_path, config.TEMPLATE_GALLERY_PATH)
+
+
+def _image_path(template_name: str) -> str | None:
+    for extension in ('jpg', 'png'):
+        path = os.path.join(IMAGE_DIR, f"{template_name}.{extension}")
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def _cached_file_id(template_name: str, path: str) -> str | None:
+    """Returns the stored file_id for a preview, unless the image changed since it was uploaded."""
+    entry = _load().get(template_name)
+    stat = os.stat(path)
+    if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+        return entry['file_id']
+    return None
+
+
+def _previews() -> list[tuple[str, str]]:
+    """Returns (template name, image path) for every template that has a preview image."""
+    previews = []
+    for template_name in config.TEMPLATES:
+        path = _image_path(template_name)
+        if path:
+            previews.append((template_name, path))
+        else:
+            logger.warning(f"Image for template '{template_name}' not found.")
+    return previews
+
+
+def selection_keyboard(template_names: list[str]) -> InlineKeyboardMarkup:
+    buttons = [
+        InlineKeyboardButton(template_name.capitalize(), callback_data=f"template_{template_name}")
+        for template_name in template_names
+    ]
+    rows = [buttons[i:i + BUTTONS_PER_ROW] for i in range(0, len(buttons), BUTTONS_PER_ROW)]
+    return InlineKeyboardMarkup(rows)
+
+
+async def _send_group(bot, chat_id: int, group: list[tuple[str, str]]) -> bool:
+    """
+    Sends one media group, uploading the images that have no stored file_id.
+
+    Returns:
+        False if Telegram rejected a stored file_id; those ids are forgotten so the
+        caller can retry with uploads.
+    """
+    photos, uploaded = [], []
+    for template_name, path in group:
+        file_id = _cached_file_id(template_name, path)
+        if file_id is None:
+            with open(path, 'rb') as f:
+                file_id = f.read()
+            uploaded.append((len(photos), template_name, path))
+        photos.append((file_id, template_name.capitalize()))
+
+    try:
+        if len(photos) == 1:
+            # Media groups need at least two items.
+            photo, caption = photos[0]
+            messages = [await bot.send_photo(chat_id=chat_id, photo=photo, caption=caption)]
+        else:
+            media = [InputMediaPhoto(media=photo, caption=caption) for photo, caption in photos]
+            messages = await bot.send_media_group(chat_id=chat_id, media=media)
+    except BadRequest as e:
+        if len(uploaded) == len(group):
+            raise
+        logger.warning(f"Stored preview file_ids were rejected ({e}), uploading again.")
+        for template_name, _ in group:
+            _file_ids.pop(template_name, None)
+        _save()
+        return False
+
+    for index, template_name, path in uploaded:
+        stat = os.stat(path)
+        _file_ids[template_name] = {
+            'file_id': messages[index].photo[-1].file_id,
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+        }
+    if uploaded:
+        _save()
+        logger.info(f"Uploaded {len(uploaded)} template preview(s) and stored their file_ids.")
+    return True
+
+
+async def send_gallery(bot, chat_id: int):
+    """Sends every available template preview to a chat, followed by a selection keyboard of all templates."""
+    previews = _previews()
+    # Split into evenly sized groups so the last one is never a lone photo.
+    group_count = math.ceil(len(previews) / MEDIA_GROUP_SIZE)
+    group_size = math.ceil(len(previews) / group_count) if group_count else 0
+    groups = [previews[i:i + group_size] for i in range(0, len(previews), group_size or 1)]
+    for group in groups:
+        if all(_cached_file_id(name, path) for name, path in group):
+            sent = await _send_group(bot, chat_id, group)
+        else:
+            # Only one chat uploads a missing preview; the others then reuse its file_id.
+            async with _upload_lock:
+                sent = await _send_group(bot, chat_id, group)
+        if not sent:
+            async with _upload_lock:
+                await _send_group(bot, chat_id, group)
+
+    await bot.send_message(
+        chat_id=chat_id,
+        text="Tap a template to select it:",
+        reply_markup=selection_keyboard(list(config.TEMPLATES)),
+    )
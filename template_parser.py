@@ -0,0 +1,214 @@
+"""
+Local parser for resumes sent back in the exact RESUME_TEMPLATE format.
+
+Most users paste the template from bot.py back with their details filled in. Such
+submissions are parsed here with plain string handling, in microseconds and with
+no model call. Anything that does not follow the template closely (unknown lines,
+unparseable skill ratings, no name) is reported as ambiguous by returning None,
+and the caller sends it to Gemini instead.
+"""
+import re
+
+import resume_schema
+
+# Template labels (lowercased, spaces collapsed) -> resume fields.
+SCALAR_LABELS = {
+    'name': 'name',
+    'birthday': 'birthday',
+    'email': 'email',
+    'phone': 'phone',
+    'web site': 'website',
+    'website': 'website',
+    'address': 'address',
+    'language': 'language',
+    'nic number': 'nic_number',
+    'nic': 'nic_number',
+}
+
+_SECTION_RE = re.compile(r'^(experience|education)\s*\d*\s*:\s*(.*)$', re.I)
+_SKILLS_RE = re.compile(r'^skills\s*:\s*(.*)$', re.I)
+_FIELD_RE = re.compile(r'^([A-Za-z][A-Za-z ]*?)\s*:\s*(.*)$')
+_RATING_RE = re.compile(r'^\s*([1-5])(?:\s*/\s*5)?\s*$')
+_PLACEHOLDER_RE = re.compile(r'^\[[^\]]*\]$')
+# Lines of the template's own instructions that users often paste back.
+_BOILERPLATE = ('please copy the template', '**template:**', 'template:')
+
+stats = {'attempts': 0, 'hits': 0, 'section_attempts': 0, 'section_hits': 0}
+
+
+def _value(text: str) -> str | None:
+    """Returns a field value, treating unfilled "[...]" placeholders as missing."""
+    text = text.strip()
+    if not text or _PLACEHOLDER_RE.match(text):
+        return None
+    return text
+
+
+def _is_placeholder_line(line: str) -> bool:
+    """Whether a line is an unfilled template line such as "[Skill 1], [Rating 1-5]"."""
+    return all(_value(part) is None for part in line.split(','))
+
+
+def _group_entries(lines: list[str]) -> list[tuple[str, bool]]:
+    """
+    Groups the lines of an experience or education section into entries. An
+    "Experience N:" header or a blank line starts a new entry, and the lines of one
+    entry are joined with spaces; unfilled placeholder entries are dropped.
+
+    Returns:
+        (entry, whether it was introduced by a header) for every entry.
+    """
+    entries = []
+    current, has_header = [], False
+    for line in lines + ['']:
+        section_match = _SECTION_RE.match(line)
+        if section_match or not line:
+            entry = _value(' '.join(current))
+            if entry and not _is_placeholder_line(entry):
+                entries.append((entry, has_header))
+            if section_match or current:
+                current, has_header = [], bool(section_match)
+            if section_match and section_match.group(2).strip():
+                current.append(section_match.group(2).strip())
+            continue
+        current.append(line)
+    return entries
+
+
+def _is_template_entry(entry: str, has_header: bool) -> bool:
+    """Whether an entry follows the template: under an "Experience N:" header, or laid out as "Title, Place, Dates, ..."."""
+    return has_header or len(entry.split(',')) >= 3
+
+
+def _parse_skill(line: str) -> dict | None:
+    name, sep, rating = line.rpartition(',')
+    match = _RATING_RE.match(rating)
+    if not sep or not match or not name.strip():
+        return None
+    return {'name': name.strip(), 'rating': int(match.group(1))}
+
+
+def parse_template(text: str) -> dict | None:
+    """
+    Parses a filled-in RESUME_TEMPLATE locally.
+
+    Returns:
+        The same dict shape parse_resume_from_template returns, or None if the text
+        does not follow the template closely enough to parse without the model.
+    """
+    stats['attempts'] += 1
+    data = {'skills': []}
+    section = None # 'experience', 'education' or 'skills' while inside one
+    # Lines of each entry section, grouped into entries by _group_entries at the end
+    entry_lines = {'experience': [], 'education': []}
+
+    def end_section():
+        if section in entry_lines:
+            entry_lines[section].append('')
+
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line or line.lower().startswith(_BOILERPLATE):
+            # A blank line ends the current entry; the next lines start another one.
+            end_section()
+            continue
+
+        section_match = _SECTION_RE.match(line)
+        if section_match:
+            end_section()
+            section = section_match.group(1).lower()
+            entry_lines[section].append(line)
+            continue
+
+        skills_match = _SKILLS_RE.match(line)
+        if skills_match:
+            end_section()
+            section = 'skills'
+            if skills_match.group(1).strip():
+                return None # Skills on the header line are free-form.
+            continue
+
+        field_match = _FIELD_RE.match(line)
+        label = ' '.join(field_match.group(1).lower().split()) if field_match else None
+        if label in SCALAR_LABELS:
+            end_section()
+            section = None
+            data[SCALAR_LABELS[label]] = _value(field_match.group(2))
+            continue
+
+        if section == 'skills':
+            if _is_placeholder_line(line):
+                continue
+            skill = _parse_skill(line)
+            if skill is None:
+                return None
+            data['skills'].append(skill)
+        elif section in entry_lines:
+            entry_lines[section].append(line)
+        else:
+            return None # A line the template does not have.
+
+    for name, lines in entry_lines.items():
+        data[name] = [entry for entry, _ in _group_entries(lines)]
+    if not data.get('name'):
+        return None
+
+    stats['hits'] += 1
+    return resume_schema.normalize_resume(data)
+
+
+def _parse_section_lines(section: str, lines: list[str]) -> dict | None:
+    if section == 'personal':
+        data = {}
+        for line in filter(None, lines):
+            field_match = _FIELD_RE.match(line)
+            label = ' '.join(field_match.group(1).lower().split()) if field_match else None
+            if label not in SCALAR_LABELS:
+                return None
+            value = _value(field_match.group(2))
+            if value is not None:
+                # A field left as its "[...]" placeholder keeps its stored value.
+                data[SCALAR_LABELS[label]] = value
+        return data
+
+    if section == 'skills':
+        skills = []
+        for line in filter(None, lines):
+            header = _SKILLS_RE.match(line)
+            if header and not header.group(1).strip():
+                continue
+            if _is_placeholder_line(line):
+                continue
+            skill = _parse_skill(line)
+            if skill is None:
+                return None
+            skills.append(skill)
+        return {'skills': skills}
+
+    entries = _group_entries(lines)
+    if not all(_is_template_entry(entry, has_header) for entry, has_header in entries):
+        return None # Free text: let the model make sense of it.
+    return {section: [entry for entry, _ in entries]}
+
+
+def parse_section(section: str, text: str) -> dict | None:
+    """
+    Parses an edit of one review-menu section ('personal', 'experience',
+    'education' or 'skills') locally.
+
+    Returns:
+        The section's fields as resume_schema.normalize_section returns them, or
+        None if the text is ambiguous and should go to the model.
+    """
+    stats['section_attempts'] += 1
+    lines = [line.strip() for line in text.splitlines()]
+    data = _parse_section_lines(section, lines)
+    updates = resume_schema.normalize_section(section, data)
+    if updates is not None:
+        stats['section_hits'] += 1
+    return updates
+
+
+def get_stats() -> dict:
+    attempts = stats['attempts']
+    return dict(stats, hit_ratio=round(stats['hits'] / attempts, 3) if attempts else 0.0)
@@ -0,0 +1,46 @@
+import os
+import logging
+
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
+
+import config
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+
+_env: Environment | None = None
+
+
+def get_environment() -> Environment:
+    """
+    Returns the process-wide Jinja2 environment, creating it on first use.
+
+    Compiled templates are kept in memory for the life of the process and their
+    bytecode is persisted to disk, so a fresh process (e.g. a new render worker)
+    skips the parse/compile step too. With TEMPLATE_AUTO_RELOAD enabled, Jinja2
+    checks each template's mtime on lookup and recompiles it after an edit.
+    """
+    global _env
+    if _env is None:
+        os.makedirs(config.TEMPLATE_BYTECODE_DIR, exist_ok=True)
+        _env = Environment(
+            loader=FileSystemLoader(TEMPLATES_DIR),
+            bytecode_cache=FileSystemBytecodeCache(config.TEMPLATE_BYTECODE_DIR),
+            auto_reload=config.TEMPLATE_AUTO_RELOAD,
+            # Keep every template compiled, never evict one for another.
+            cache_size=max(400, len(config.TEMPLATES) * 2),
+        )
+    return _env
+
+
+def precompile():
+    """Loads and compiles every template in config.TEMPLATES into the shared environment."""
+    env = get_environment()
+    for template_path in config.TEMPLATES.values():
+        template_filename = os.path.basename(template_path)
+        try:
+            env.get_template(template_filename)
+        except Exception as e:
+            logger.error(f"Failed to precompile template '{template_filename}': {e}")
+    logger.info(f"Precompiled {len(config.TEMPLATES)} templates.")
@@ -0,0 +1,97 @@
+"""
+Asynchronous ingestion of webhook updates.
+
+The webhook handler only enqueues an update and answers Telegram straight away;
+a pool of worker tasks feeds the queue to the bot. Updates from the same chat are
+processed strictly in order, while different chats are processed concurrently.
+When the queue is full the webhook answers with an error so Telegram backs off
+and redelivers later, instead of the bot buffering without bound.
+"""
+import asyncio
+import logging
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+def chat_key(update) -> int:
+    """Returns the key that orders an update: its chat, else its user, else the update itself."""
+    if update.effective_chat:
+        return update.effective_chat.id
+    if update.effective_user:
+        return update.effective_user.id
+    return update.update_id
+
+
+class UpdateDispatcher:
+    """A bounded queue of updates, drained by workers that keep per-chat ordering."""
+
+    def __init__(self, process_update, workers: int, max_pending: int):
+        self.process_update = process_update
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.rejected = 0
+        self._chats: dict[int, deque] = {} # chat key -> updates not yet processed, oldest first
+        self._ready: asyncio.Queue = asyncio.Queue() # chat keys with updates and no worker on them
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        logger.info(f"Update dispatcher started with {self.workers} worker(s).")
+
+    def submit(self, update) -> bool:
+        """
+        Queues an update for processing.
+
+        Returns:
+            False if the queue is full and the update was not accepted.
+        """
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            return False
+
+        self.pending += 1
+        key = chat_key(update)
+        queue = self._chats.get(key)
+        if queue is None:
+            # No worker owns this chat yet: hand it to the next free one.
+            self._chats[key] = deque([update])
+            self._ready.put_nowait(key)
+        else:
+            queue.append(update)
+        return True
+
+    async def _worker(self):
+        while True:
+            key = await self._ready.get()
+            queue = self._chats[key]
+            while queue:
+                update = queue[0]
+                try:
+                    await self.process_update(update)
+                except Exception as e:
+                    logger.error(f"Error processing update {update.update_id}: {e}")
+                finally:
+                    queue.popleft()
+                    self.pending -= 1
+            del self._chats[key]
+
+    async def stop(self, timeout: float = 10):
+        """Waits up to `timeout` seconds for queued updates to finish, then stops the workers."""
+        deadline = asyncio.get_running_loop().time() + timeout
+        while self.pending and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.1)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self.pending:
+            logger.warning(f"Update dispatcher stopped with {self.pending} unprocessed update(s).")
+
+    def stats(self) -> dict:
+        return {
+            'pending': self.pending,
+            'max_pending': self.max_pending,
+            'active_chats': len(self._chats),
+            'rejected': self.rejected,
+        }
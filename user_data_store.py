@@ -1,35 +1,204 @@
 import json
 import os
+import time
+import sqlite3
 import logging
 
+import config
+
 logger = logging.getLogger(__name__)
 
+# Legacy store, migrated into the database on first start.
 DATA_FILE = 'generated_users.json'
 
-def _load_data():
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, 'r') as f:
-            try:
-                return json.load(f)
-            except json.JSONDecodeError:
-                return []
-    return []
-
-def _save_data(data):
-    with open(DATA_FILE, 'w') as f:
-        json.dump(data, f, indent=4)
-
-def add_user(username: str):
-    """Adds a username to the list of users who have generated a PDF."""
+_conn: sqlite3.Connection | None = None
+# Generations waiting to be written: (username, template name, timestamp)
+_pending: list[tuple[str, str | None, float]] = []
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    first_generated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS users_first_generated_at ON users (first_generated_at, username);
+CREATE TABLE IF NOT EXISTS generations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    template TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS generations_created_at ON generations (created_at);
+CREATE INDEX IF NOT EXISTS generations_username ON generations (username);
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS daily_counts (
+    day TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS template_counts (
+    template TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+"""
+
+def _connect() -> sqlite3.Connection:
+    """Opens the database on first use, migrating the legacy JSON file if present."""
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(config.USER_DB_PATH, check_same_thread=False)
+        # WAL lets readers (e.g. /data) run while a batch is being written.
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.execute("PRAGMA synchronous=NORMAL")
+        _conn.executescript(_SCHEMA)
+        _migrate_json()
+        _backfill_counters()
+    return _conn
+
+def initialize():
+    """Creates and migrates the database, then closes it; run once before starting several processes on it."""
+    _connect()
+    close()
+
+def _migrate_json():
+    """Imports usernames from the old generated_users.json and renames the file."""
+    if not os.path.exists(DATA_FILE):
+        return
+    with open(DATA_FILE, 'r') as f:
+        try:
+            usernames = json.load(f)
+        except json.JSONDecodeError:
+            usernames = []
+
+    migrated_at = os.path.getmtime(DATA_FILE)
+    with _conn:
+        _conn.executemany(
+            "INSERT OR IGNORE INTO users (username, first_generated_at) VALUES (?, ?)",
+            [(username, migrated_at) for username in usernames if username],
+        )
+    os.replace(DATA_FILE, DATA_FILE + '.migrated')
+    logger.info(f"Migrated {len(usernames)} user(s) from {DATA_FILE} to {config.USER_DB_PATH}.")
+
+def _backfill_counters():
+    """Builds the aggregate counters once for a database that predates them."""
+    if _conn.execute("SELECT 1 FROM counters LIMIT 1").fetchone():
+        return
+    with _conn:
+        _conn.execute("INSERT INTO counters (name, count) SELECT 'users', COUNT(*) FROM users")
+        _conn.execute("INSERT INTO counters (name, count) SELECT 'pdfs', COUNT(*) FROM generations")
+        _conn.execute(
+            "INSERT INTO daily_counts (day, count) "
+            "SELECT date(created_at, 'unixepoch'), COUNT(*) FROM generations GROUP BY 1"
+        )
+        _conn.execute(
+            "INSERT INTO template_counts (template, count) "
+            "SELECT COALESCE(template, 'unknown'), COUNT(*) FROM generations GROUP BY 1"
+        )
+
+def _increment(conn: sqlite3.Connection, table: str, key_column: str, counts: dict):
+    """Adds to counter rows, creating any that don't exist yet."""
+    conn.executemany(
+        f"INSERT INTO {table} ({key_column}, count) VALUES (?, ?) "
+        f"ON CONFLICT({key_column}) DO UPDATE SET count = count + excluded.count",
+        counts.items(),
+    )
+
+def flush():
+    """Writes all buffered generations, and the counters they update, in a single transaction."""
+    if not _pending:
+        return
+    conn = _connect()
+    batch = _pending[:]
+    _pending.clear()
+
+    daily, templates = {}, {}
+    for _, template_name, created_at in batch:
+        day = time.strftime('%Y-%m-%d', time.gmtime(created_at))
+        daily[day] = daily.get(day, 0) + 1
+        templates[template_name or 'unknown'] = templates.get(template_name or 'unknown', 0) + 1
+
+    first_seen = {}
+    for username, _, created_at in batch:
+        first_seen.setdefault(username, created_at)
+
+    with conn:
+        new_users = 0
+        for username, created_at in first_seen.items():
+            # rowcount is 0 when the user already existed and the insert was ignored.
+            if conn.execute(
+                "INSERT OR IGNORE INTO users (username, first_generated_at) VALUES (?, ?)", (username, created_at)
+            ).rowcount:
+                new_users += 1
+                logger.info(f"Added user '{username}' to the data store.")
+        conn.executemany(
+            "INSERT INTO generations (username, template, created_at) VALUES (?, ?, ?)",
+            batch,
+        )
+        _increment(conn, 'counters', 'name', {'users': new_users, 'pdfs': len(batch)})
+        _increment(conn, 'daily_counts', 'day', daily)
+        _increment(conn, 'template_counts', 'template', templates)
+
+def add_user(username: str, template_name: str = None):
+    """Records that a user generated a PDF, and with which template."""
     if not username:
         return
 
-    data = _load_data()
-    if username not in data:
-        data.append(username)
-        _save_data(data)
-        logger.info(f"Added user '{username}' to the data store.")
+    _pending.append((username, template_name, time.time()))
+    if len(_pending) >= config.USER_DB_BATCH_SIZE:
+        flush()
+
+def get_users_page(offset: int, limit: int) -> list[str]:
+    """Returns one page of users, in the order they first generated a PDF."""
+    flush()
+    return [row[0] for row in _connect().execute(
+        "SELECT username FROM users ORDER BY first_generated_at, username LIMIT ? OFFSET ?", (limit, offset)
+    )]
+
+def iter_generations():
+    """
+    Yields every generation as (username, template, created_at), reading from the database in chunks.
+
+    Users with no recorded generation (those migrated from the legacy JSON file) come
+    first, as one row each with no template, dated when they were migrated.
+
+    Uses its own connection so it can run in a worker thread while the bot keeps
+    writing; call flush() first to include buffered generations.
+    """
+    _connect()
+    conn = sqlite3.connect(config.USER_DB_PATH)
+    try:
+        for query in (
+            "SELECT username, NULL, first_generated_at FROM users "
+            "WHERE NOT EXISTS (SELECT 1 FROM generations WHERE generations.username = users.username) "
+            "ORDER BY first_generated_at, username",
+            "SELECT username, template, created_at FROM generations ORDER BY id",
+        ):
+            cursor = conn.execute(query)
+            while True:
+                rows = cursor.fetchmany(500)
+                if not rows:
+                    break
+                yield from rows
+    finally:
+        conn.close()
+
+def get_stats(days: int = 7) -> dict:
+    """Returns totals, PDFs per day for the last `days` days, and PDFs per template, from the counters."""
+    flush()
+    conn = _connect()
+    counters = dict(conn.execute("SELECT name, count FROM counters"))
+    return {
+        'users': counters.get('users', 0),
+        'pdfs': counters.get('pdfs', 0),
+        'per_day': conn.execute("SELECT day, count FROM daily_counts ORDER BY day DESC LIMIT ?", (days,)).fetchall(),
+        'per_template': conn.execute("SELECT template, count FROM template_counts ORDER BY count DESC").fetchall(),
+    }
 
-def get_all_users() -> list[str]:
-    """Returns a list of all users who have generated a PDF."""
-    return _load_data()
+def close():
+    """Flushes buffered writes and closes the database."""
+    global _conn
+    flush()
+    if _conn is not None:
+        _conn.close()
+        _conn = None
@@ -0,0 +1,214 @@
+"""
+Multi-process mode: a supervisor in front of WEB_WORKERS bot processes.
+
+The supervisor owns the public port. It sets the Telegram webhook once, starts
+the worker processes (each a full bot listening on its own Unix socket),
+restarts any that exit, and forwards every update to the worker chosen by hashing
+the update's chat. A conversation therefore always lands on the same worker,
+which keeps its in-memory state (conversation position, background tasks, the
+update dedupe window) in one place, while the SQLite stores are shared by all
+workers on the host.
+"""
+import os
+import sys
+import json
+import asyncio
+import logging
+import subprocess
+
+import aiohttp
+from aiohttp import web
+from telegram import Bot
+
+import config
+import user_data_store
+
+logger = logging.getLogger(__name__)
+
+# Headers of the webhook request the workers need to see.
+_FORWARDED_HEADERS = ('Content-Type', 'X-Telegram-Bot-Api-Secret-Token')
+
+
+def route_key(update: dict) -> int:
+    """
+    Returns the key an update is routed by, from its raw JSON: its chat, else its
+    user, else the update itself (the same order as update_queue.chat_key).
+    """
+    payload = next((value for key, value in update.items() if key != 'update_id' and isinstance(value, dict)), {})
+    chat = payload.get('chat') or (payload.get('message') or {}).get('chat')
+    if chat and 'id' in chat:
+        return chat['id']
+    user = payload.get('from') or payload.get('user')
+    if user and 'id' in user:
+        return user['id']
+    return update.get('update_id', 0)
+
+
+def worker_for(key: int, worker_count: int = None) -> int:
+    return key % (worker_count or config.WEB_WORKERS)
+
+
+def owns(key: int) -> bool:
+    """Whether this process handles a chat: always in single-process mode, else if it is routed here."""
+    return config.WORKER_INDEX is None or worker_for(key) == config.WORKER_INDEX
+
+
+def socket_path(index: int) -> str:
+    return os.path.join(config.WORKER_SOCKET_DIR, f"worker_{index}.sock")
+
+
+class Supervisor:
+    """Starts, restarts and stops the worker processes, and forwards updates to them."""
+
+    def __init__(self, script: str, worker_count: int):
+        self.script = script
+        self.worker_count = worker_count
+        self.restarts = 0
+        self.forward_errors = 0
+        self._processes: list[subprocess.Popen | None] = [None] * worker_count
+        self._sessions: list[aiohttp.ClientSession] = []
+        self._monitor: asyncio.Task | None = None
+        self._stopping = False
+
+    def _spawn(self, index: int):
+        path = socket_path(index)
+        if os.path.exists(path):
+            os.remove(path)
+        env = dict(os.environ, WORKER_INDEX=str(index), WORKER_SOCKET=path)
+        self._processes[index] = subprocess.Popen([sys.executable, self.script], env=env)
+        logger.info(f"Started worker {index} (pid {self._processes[index].pid}).")
+
+    async def start(self):
+        os.makedirs(config.WORKER_SOCKET_DIR, exist_ok=True)
+        for index in range(self.worker_count):
+            self._spawn(index)
+            self._sessions.append(aiohttp.ClientSession(connector=aiohttp.UnixConnector(path=socket_path(index))))
+        self._monitor = asyncio.create_task(self._watch())
+        await self._wait_ready(timeout=60)
+
+    async def _is_ready(self, index: int) -> bool:
+        """Whether a worker answers its health check (the socket file alone may be stale or not yet served)."""
+        try:
+            async with self._sessions[index].get("http://worker/health") as response:
+                return response.status == 200
+        except aiohttp.ClientError:
+            return False
+
+    async def _wait_ready(self, timeout: float):
+        """Waits until every worker is serving, so the webhook is not set before anyone can answer it."""
+        deadline = asyncio.get_running_loop().time() + timeout
+        pending = set(range(self.worker_count))
+        while pending:
+            waiting = sorted(pending)
+            ready = await asyncio.gather(*(self._is_ready(index) for index in waiting))
+            pending -= {index for index, is_ready in zip(waiting, ready) if is_ready}
+            if not pending:
+                return
+            if asyncio.get_running_loop().time() > deadline:
+                logger.warning(f"Workers {sorted(pending)} are not serving yet; their updates are answered 503 until they are.")
+                return
+            await asyncio.sleep(0.2)
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(1)
+            for index, process in enumerate(self._processes):
+                if process.poll() is not None and not self._stopping:
+                    logger.error(f"Worker {index} exited with code {process.returncode}, restarting it.")
+                    self.restarts += 1
+                    self._spawn(index)
+
+    async def forward(self, request: web.Request) -> web.Response:
+        """Passes a webhook request to the worker that owns its chat, relaying the worker's answer."""
+        body = await request.read()
+        try:
+            update = json.loads(body)
+        except json.JSONDecodeError:
+            logger.error("Unable to parse JSON from Telegram update.")
+            return web.Response(body=b"Unable to parse JSON", status=400)
+
+        index = worker_for(route_key(update), self.worker_count)
+        headers = {name: request.headers[name] for name in _FORWARDED_HEADERS if name in request.headers}
+        try:
+            async with self._sessions[index].post(f"http://worker{request.path}", data=body, headers=headers) as response:
+                relayed = {'Retry-After': response.headers['Retry-After']} if 'Retry-After' in response.headers else None
+                return web.Response(body=await response.read(), status=response.status, headers=relayed)
+        except aiohttp.ClientError as e:
+            # The worker is down or restarting: make Telegram redeliver later
+            self.forward_errors += 1
+            logger.error(f"Could not forward update to worker {index}: {e}")
+            return web.Response(body=b"Worker unavailable", status=503, headers={"Retry-After": "5"})
+
+    async def metrics(self) -> dict:
+        async def fetch(index: int):
+            try:
+                async with self._sessions[index].get("http://worker/metrics") as response:
+                    return await response.json()
+            except aiohttp.ClientError as e:
+                return {'error': str(e)}
+
+        results = await asyncio.gather(*(fetch(index) for index in range(self.worker_count)))
+        return {
+            'restarts': self.restarts,
+            'forward_errors': self.forward_errors,
+            'workers': dict(enumerate(results)),
+        }
+
+    async def stop(self, timeout: float = 30):
+        """Asks every worker to shut down gracefully, killing those that don't within `timeout` seconds."""
+        self._stopping = True
+        if self._monitor is not None:
+            self._monitor.cancel()
+        for process in self._processes:
+            if process is not None and process.poll() is None:
+                process.terminate()
+        for index, process in enumerate(self._processes):
+            if process is None:
+                continue
+            try:
+                await asyncio.to_thread(process.wait, timeout)
+            except subprocess.TimeoutExpired:
+                logger.warning(f"Worker {index} did not stop in time, killing it.")
+                process.kill()
+        for session in self._sessions:
+            await session.close()
+
+
+def run_supervisor(script: str, port: int, set_webhook):
+    """
+    Serves the webhook on `port` and forwards it to WEB_WORKERS copies of `script`.
+
+    Args:
+        script: The bot script each worker runs.
+        port: The public port.
+        set_webhook: Coroutine function that registers the webhook given a telegram.Bot;
+            called once, after the workers are listening.
+    """
+    supervisor = Supervisor(script, config.WEB_WORKERS)
+
+    async def on_startup(app: web.Application):
+        # Create and migrate the shared store once, before workers race to do it
+        user_data_store.initialize()
+        await supervisor.start()
+        async with Bot(config.TELEGRAM_TOKEN) as bot:
+            await set_webhook(bot)
+        logger.info(f"Supervisor started {config.WEB_WORKERS} workers and set the webhook.")
+
+    async def on_shutdown(app: web.Application):
+        await supervisor.stop()
+
+    async def health_check_handler(_: web.Request) -> web.Response:
+        return web.Response(text="OK")
+
+    async def metrics_handler(_: web.Request) -> web.Response:
+        return web.json_response(await supervisor.metrics())
+
+    app = web.Application()
+    app.on_startup.append(on_startup)
+    app.on_shutdown.append(on_shutdown)
+    app.router.add_post(f"/{config.TELEGRAM_TOKEN}", supervisor.forward)
+    app.router.add_get("/health", health_check_handler)
+    app.router.add_get("/metrics", metrics_handler)
+
+    logger.info(f"Starting supervisor on port {port}...")
+    web.run_app(app, host="0.0.0.0", port=port)